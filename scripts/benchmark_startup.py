@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the startup time of the detectors
+
+For every detector this measures, in fresh Python processes, the time needed
+to import the detector through run_detector, and the time of a full run of
+run_detector.py with --help, which includes the interpreter startup.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from run_detector import DETECTORS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_CODE = """
+import time
+t = time.perf_counter()
+import run_detector
+run_detector.load_detector(%r)
+print(time.perf_counter() - t)
+"""
+
+
+def time_import(detector):
+    out = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_CODE % detector], cwd=HERE
+    )
+    return float(out.decode().strip())
+
+
+def time_run(detector):
+    t = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, "run_detector.py", detector, "--help"],
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - t
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=5)
+    parser.add_argument(
+        "detectors", nargs="*", help="Detectors to measure (default: all)"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    detectors = args.detectors or sorted(DETECTORS)
+    print("%25s\t%12s\t%12s" % ("detector", "import (ms)", "run (ms)"))
+    for detector in detectors:
+        t_import = [time_import(detector) for _ in range(args.repeat)]
+        t_run = [time_run(detector) for _ in range(args.repeat)]
+        print(
+            "%25s\t%12.1f\t%12.1f"
+            % (
+                detector,
+                1000 * statistics.median(t_import),
+                1000 * statistics.median(t_run),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of the number test of the type detection
+
+This compares the number_1, number_2, and number_3 regexes with the
+recognizer in scan_number() on a corpus of random number-like cells, after
+checking that the two agree on it.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import argparse
+import timeit
+
+from detection.lib.types import rudi_types
+from tests.corpora import number_corpus
+
+
+def regex_number(cell):
+    return any(
+        rudi_types.PATTERNS[name].fullmatch(cell)
+        for name in ["number_1", "number_2", "number_3"]
+    )
+
+
+def bench(func, cells, repeat):
+    timer = timeit.Timer(lambda: [func(c) for c in cells])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(cells)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n", "--n-cells", dest="n_cells", type=int, default=100000
+    )
+    parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    cells = number_corpus(n_cases=args.n_cells)
+    n_diff = sum(
+        rudi_types.scan_number(c) != regex_number(c) for c in cells
+    )
+    if n_diff:
+        raise SystemExit(
+            "scan_number differs from the regexes on %i cells" % n_diff
+        )
+
+    t_regex = bench(regex_number, cells, args.repeat)
+    t_scan = bench(rudi_types.scan_number, cells, args.repeat)
+    print("regexes:     %.3f us/cell" % (t_regex * 1e6))
+    print("scan_number: %.3f us/cell" % (t_scan * 1e6))
+    print("speedup:     %.2fx" % (t_regex / t_scan))
+
+
+if __name__ == "__main__":
+    main()
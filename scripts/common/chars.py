@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Memoized classification of characters
+
+The tests of whether a character can be a delimiter or an escape character
+round-trip the character through the encoding of the file and look up its
+unicode category. They are called for many characters of every file, so the
+outcome is stored per (char, encoding). For the first 256 code points (ASCII
+and Latin-1) a dense table is built per encoding on first use.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import codecs
+
+DENSE_SIZE = 256
+
+
+def roundtrip(char, encoding):
+    """ Encode and decode a character with the given encoding """
+    return codecs.decode(bytes(char, encoding), encoding=encoding)
+
+
+class CharTable(object):
+    """Memoized classification of characters
+
+    The function ``func`` receives the character after the round-trip
+    through the encoding. Characters that can't be encoded are not stored,
+    so these raise the same error on every call.
+
+    >>> is_upper = CharTable(str.isupper)
+    >>> is_upper('A', 'ascii'), is_upper('a', 'ascii'), is_upper('Ä', 'utf-8')
+    (True, False, True)
+    >>> is_upper('Ä', 'ascii')
+    Traceback (most recent call last):
+    ...
+    UnicodeEncodeError: 'ascii' codec can't encode character '\\xc4' in position 0: ordinal not in range(128)
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self._dense = {}
+        self._memo = {}
+
+    def _make_dense(self, encoding):
+        dense = []
+        for i in range(DENSE_SIZE):
+            try:
+                dense.append(self.func(roundtrip(chr(i), encoding)))
+            except (LookupError, TypeError, UnicodeError):
+                # left to the slow path, which raises the error
+                dense.append(None)
+        return dense
+
+    def __call__(self, char, encoding):
+        if len(char) == 1 and ord(char) < DENSE_SIZE:
+            try:
+                dense = self._dense[encoding]
+            except KeyError:
+                dense = self._dense[encoding] = self._make_dense(encoding)
+            result = dense[ord(char)]
+            if not result is None:
+                return result
+
+        key = (char, encoding)
+        try:
+            return self._memo[key]
+        except KeyError:
+            result = self._memo[key] = self.func(roundtrip(char, encoding))
+            return result
@@ -49,7 +49,10 @@ class DetectorResult(object):
         status=None,
         status_msg=None,
         original_detector=None,
-        note=None
+        note=None,
+        sample_sizes=None,
+        n_dialects=None,
+        n_pruned=None,
     ):
         self.detector = detector
         self.dialect = dialect
@@ -60,6 +63,13 @@ class DetectorResult(object):
         self.status_msg = status_msg
         self.original_detector = original_detector or detector
         self.note = note
+        # list of dicts with the sample size of the type score of a dialect,
+        # if the type scores were estimated by sampling
+        self.sample_sizes = sample_sizes
+        # number of candidate dialects, and the number of these that were
+        # removed by the prefilter before scoring
+        self.n_dialects = n_dialects
+        self.n_pruned = n_pruned
 
     def validate(self):
         assert isinstance(self.status, Status)
@@ -94,6 +104,12 @@ class DetectorResult(object):
             output["status_msg"] = self.status_msg.name
         if not self.note is None:
             output['note'] = self.note
+        if not self.sample_sizes is None:
+            output["sample_sizes"] = self.sample_sizes
+        if not self.n_dialects is None:
+            output["n_dialects"] = self.n_dialects
+        if not self.n_pruned is None:
+            output["n_pruned"] = self.n_pruned
         if not self.detector == self.original_detector:
             output["original_detector"] = self.original_detector
         as_json = json.dumps(output)
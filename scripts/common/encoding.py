@@ -11,10 +11,13 @@ Date: 2018-11-06
 
 import chardet
 
+BLOCK_SIZE = 65536
+
+
 def get_encoding(filename):
     detector = chardet.UniversalDetector()
     final_chunk = False
-    blk_size = 65536
+    blk_size = BLOCK_SIZE
     with open(filename, "rb") as fid:
         while (not final_chunk) and (not detector.done):
             chunk = fid.read(blk_size)
@@ -24,3 +27,16 @@ def get_encoding(filename):
     detector.close()
     encoding = detector.result.get("encoding", None)
     return encoding
+
+
+def detect_encoding(raw):
+    """ Detect the encoding of the bytes of a file, see get_encoding() """
+    detector = chardet.UniversalDetector()
+    view = memoryview(raw)
+    for start in range(0, max(1, len(raw)), BLOCK_SIZE):
+        detector.feed(view[start : start + BLOCK_SIZE])
+        if detector.done:
+            break
+    detector.close()
+    encoding = detector.result.get("encoding", None)
+    return encoding
@@ -9,12 +9,12 @@ License: See the LICENSE file.
 Date: 2018-11-06
 """
 
-import codecs
 import unicodedata
 
+from .chars import CharTable
 
-def is_potential_escapechar(char, encoding):
-    as_unicode = codecs.decode(bytes(char, encoding), encoding=encoding)
+
+def _is_potential_escapechar(as_unicode):
     ctr = unicodedata.category(as_unicode)
     block = ["!", "?", '"', "'", ".", ",", ";", ":", "%", "*", "&", "#"]
     if ctr == "Po":
@@ -22,3 +22,10 @@ def is_potential_escapechar(char, encoding):
             return False
         return True
     return False
+
+
+_ESCAPECHARS = CharTable(_is_potential_escapechar)
+
+
+def is_potential_escapechar(char, encoding):
+    return _ESCAPECHARS(char, encoding)
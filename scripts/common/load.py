@@ -9,7 +9,17 @@ License: See the LICENSE file.
 Date: 2018-11-06
 """
 
-from .encoding import get_encoding
+import locale
+
+from .encoding import detect_encoding, get_encoding
+
+
+def _decode_error(filename):
+    print(
+        "UnicodeDecodeError occurred for file: %s. "
+        "This means the encoding was determined incorrectly "
+        "or the file is corrupt." % filename
+    )
 
 
 def load_file(filename, encoding="unknown"):
@@ -19,9 +29,25 @@ def load_file(filename, encoding="unknown"):
         try:
             return fid.read()
         except UnicodeDecodeError:
-            print(
-                "UnicodeDecodeError occurred for file: %s. "
-                "This means the encoding was determined incorrectly "
-                "or the file is corrupt." % filename
-            )
+            _decode_error(filename)
             return None
+
+
+def load_file_with_encoding(filename):
+    """
+    Read a file once and return its encoding and its text.
+
+    The encoding is detected from the bytes of the file, and the text is
+    decoded from the same bytes, which gives the same result as calling
+    get_encoding() and load_file(). The text is None if it can't be decoded.
+    """
+    with open(filename, "rb") as fid:
+        raw = fid.read()
+    encoding = detect_encoding(raw)
+    # open() uses the locale encoding when the encoding is unknown
+    codec = encoding or locale.getpreferredencoding(False)
+    try:
+        return encoding, raw.decode(codec)
+    except UnicodeDecodeError:
+        _decode_error(filename)
+        return encoding, None
@@ -11,6 +11,23 @@ Date: 2018-10-22
 
 """
 
+import hashlib
+import re
+
+from array import array
+from collections import namedtuple
+
+from .structural import structural_chars
+
+CHUNK_SIZE = 65536
+
+# Number of dialects that iter_spans() parses together
+SPANS_GROUP_SIZE = 8
+
+TableFingerprint = namedtuple(
+    "TableFingerprint", ["n_rows", "row_lengths", "digest"]
+)
+
 
 def parse_file(
     S, dialect=None, delimiter=None, quotechar=None, escapechar=None
@@ -157,12 +174,25 @@ def parse_file(
     *inside* the preceding quoted block. This seems counterintuitive and 
     incorrect and thus this behavior has not been duplicated.
 
+    (3) Dialects without an escape character are dispatched to faster 
+    tokenizers that jump between structural characters instead of visiting 
+    every character. These give the same result as the generic parser.
+
     """
     if not dialect is None:
         delimiter = dialect.delimiter if delimiter is None else delimiter
         quotechar = dialect.quotechar if quotechar is None else quotechar
         escapechar = dialect.escapechar if escapechar is None else escapechar
 
+    if not escapechar:
+        if not quotechar:
+            return _parse_unquoted(S, delimiter)
+        return _parse_quoted(S, delimiter, quotechar)
+    return _parse_generic(S, delimiter, quotechar, escapechar)
+
+
+def _parse_generic(S, delimiter, quotechar, escapechar):
+    """ Character-by-character parser that handles every dialect """
     quote_cond = lambda c, q: q and c.startswith(q) and c.endswith(q)
 
     in_quotes = False
@@ -240,3 +270,665 @@ def parse_file(
         rows.append(row)
 
     return rows
+
+
+def _parse_unquoted(S, delimiter):
+    """
+    Parser for dialects without quote and escape character.
+
+    In this case a row is simply a non-empty line and the cells are found by 
+    splitting the line on the delimiter.
+
+    >>> _parse_unquoted('a,b\\r\\n\\r\\nc,d\\r\\n', ',')
+    [['a', 'b'], ['c', 'd']]
+    >>> _parse_unquoted('"A","B","C",,,,', ',')
+    [['"A"', '"B"', '"C"', '', '', '', '']]
+    >>> _parse_unquoted('a,\\rb,c', None)
+    [['a,'], ['b,c']]
+    """
+    if not delimiter or delimiter in ["\r", "\n"]:
+        return [[line] for line in S.replace("\r", "\n").split("\n") if line]
+    return [
+        line.split(delimiter)
+        for line in S.replace("\r", "\n").split("\n")
+        if line
+    ]
+
+
+def _parse_quoted(S, delimiter, quotechar):
+    """
+    Parser for dialects with a quote character but without escape character.
+
+    Outside quotes we jump to the next delimiter, quote character, or newline, 
+    and inside quotes we jump to the next quote character. The text in between 
+    is copied into the field as a single slice.
+
+    >>> _parse_quoted('a,"bc""d",e\\r\\n"f\\ng",h', ',', '"')
+    [['a', 'bc"d', 'e'], ['f\\ng', 'h']]
+    >>> _parse_quoted('a,b,"c,d\\n', ',', '"')
+    [['a', 'b', 'c,d\\n']]
+    """
+    quote_cond = lambda c, q: c.startswith(q) and c.endswith(q)
+
+    specials = [quotechar, "\r", "\n"]
+    if delimiter and not delimiter in specials:
+        specials.append(delimiter)
+    structural = re.compile("|".join(map(re.escape, specials)))
+
+    rows = []
+    row = []
+    parts = []
+    in_quotes = False
+    i = 0
+    n = len(S)
+    while i < n:
+        if in_quotes:
+            j = S.find(quotechar, i)
+            if j == -1:
+                parts.append(S[i:])
+                break
+            parts.append(S[i : j + 1])
+            if j + 1 < n and S[j + 1] == quotechar:
+                i = j + 2
+            else:
+                in_quotes = False
+                i = j + 1
+            continue
+
+        m = structural.search(S, i)
+        if m is None:
+            parts.append(S[i:])
+            break
+        j = m.start()
+        if j > i:
+            parts.append(S[i:j])
+        s = S[j]
+        i = j + 1
+        if s == quotechar:
+            in_quotes = True
+            parts.append(s)
+        elif s in ["\r", "\n"]:
+            if not parts and not row:
+                continue
+            field = "".join(parts)
+            if quote_cond(field, quotechar):
+                field = field[1:-1]
+            row.append(field)
+            rows.append(row)
+            row = []
+            parts = []
+        else:
+            field = "".join(parts)
+            if quote_cond(field, quotechar):
+                field = field[1:-1]
+            row.append(field)
+            parts = []
+
+    if n == 0:
+        return rows
+
+    field = "".join(parts)
+    s = S[-1]
+    if quote_cond(field, quotechar):
+        field = field[1:-1]
+    elif in_quotes:
+        if field.startswith(quotechar):
+            field = field[1:]
+        s = ""
+    if not s in ["\r", "\n"]:
+        row.append(field)
+        rows.append(row)
+
+    return rows
+
+
+class CellSpans(object):
+    """
+    Cells of a parsed CSV file stored as offsets into the original text.
+
+    For every cell we store the start and end offset in ``S`` and whether 
+    quotes were stripped from it, and for every row the number of cells up to 
+    and including that row. Cells are only turned into strings when they are 
+    requested. The rare cells that are not a contiguous slice of ``S`` (for 
+    instance because an escape character or a double quote was removed) are 
+    kept in ``special`` as strings.
+
+    Iterating over a CellSpans object yields the cells as strings and its 
+    length is the number of cells, so it can be used in place of a list of 
+    cells.
+    """
+
+    def __init__(self, S):
+        self.S = S
+        self.starts = array("l")
+        self.ends = array("l")
+        self.quoted = array("b")
+        self.row_ends = array("l")
+        self.special = {}
+
+    def add_cell(self, start, end, quoted=False, value=None):
+        if not value is None:
+            self.special[len(self.starts)] = value
+        self.starts.append(start)
+        self.ends.append(end)
+        self.quoted.append(quoted)
+
+    def end_row(self):
+        self.row_ends.append(len(self.starts))
+
+    @property
+    def n_rows(self):
+        return len(self.row_ends)
+
+    def cell(self, k):
+        if k in self.special:
+            return self.special[k]
+        return self.S[self.starts[k] : self.ends[k]]
+
+    def row_lengths(self):
+        prev = 0
+        for end in self.row_ends:
+            yield end - prev
+            prev = end
+
+    def rows(self):
+        prev = 0
+        for end in self.row_ends:
+            yield [self.cell(k) for k in range(prev, end)]
+            prev = end
+
+    def to_list(self):
+        return list(self.rows())
+
+    def fingerprint(self):
+        """ Shape and digest of the table, see ``table_fingerprint`` """
+        h = hashlib.blake2b(digest_size=16)
+        for cell in self:
+            h.update(len(cell).to_bytes(8, "little"))
+            h.update(cell.encode("utf-8", "surrogatepass"))
+        return TableFingerprint(
+            n_rows=self.n_rows,
+            row_lengths=array("l", self.row_lengths()),
+            digest=h.digest(),
+        )
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for k in range(len(self.starts)):
+            yield self.cell(k)
+
+    def __eq__(self, other):
+        """ Two parse results are equal if they give the same table """
+        if not isinstance(other, CellSpans):
+            return NotImplemented
+        if self.row_ends != other.row_ends:
+            return False
+        same_text = self.S is other.S
+        for k in range(len(self.starts)):
+            if (
+                same_text
+                and self.starts[k] == other.starts[k]
+                and self.ends[k] == other.ends[k]
+                and not k in self.special
+                and not k in other.special
+            ):
+                continue
+            if self.cell(k) != other.cell(k):
+                return False
+        return True
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+
+def parse_spans(
+    S,
+    dialect=None,
+    delimiter=None,
+    quotechar=None,
+    escapechar=None,
+    index=None,
+):
+    """
+    Parse a CSV file given as a string into a CellSpans object.
+
+    This gives the same table as ``parse_file``, but cells are recorded as 
+    offsets into ``S`` instead of as new strings. The parser jumps between 
+    structural characters (delimiter, quote, escape, and newlines) and only 
+    builds a string for a cell if it is not a slice of ``S``. If a 
+    StructuralIndex of ``S`` is given, the positions of the structural 
+    characters are taken from it instead of searching the text.
+
+    Tests
+    -----
+
+    >>> spans = parse_spans('a,"b,c",d\\r\\ne,"f""g",', delimiter=',', quotechar='"')
+    >>> list(spans.starts), list(spans.ends), list(spans.quoted)
+    ([0, 3, 8, 11, 13, 20], [1, 6, 9, 12, 19, 20], [0, 1, 0, 0, 1, 0])
+    >>> spans.special
+    {4: 'f"g'}
+    >>> spans.to_list()
+    [['a', 'b,c', 'd'], ['e', 'f"g', '']]
+    >>> len(spans), spans.n_rows, list(spans.row_lengths())
+    (6, 2, [3, 3])
+
+    """
+    if not dialect is None:
+        delimiter = dialect.delimiter if delimiter is None else delimiter
+        quotechar = dialect.quotechar if quotechar is None else quotechar
+        escapechar = dialect.escapechar if escapechar is None else escapechar
+
+    specials = structural_chars(delimiter, quotechar, escapechar)
+    if index is None:
+        structural = re.compile("|".join(map(re.escape, specials)))
+        positions = (m.start() for m in structural.finditer(S))
+    else:
+        positions = index.iter_positions(specials)
+
+    spans = CellSpans(S)
+    machine = _span_machine(S, delimiter, quotechar, escapechar, spans)
+    next(machine)
+    for i in positions:
+        machine.send(i)
+    _close_machine(machine)
+    return spans
+
+
+def _close_machine(machine):
+    try:
+        machine.send(None)
+    except StopIteration:
+        pass
+
+
+def _span_machine(S, delimiter, quotechar, escapechar, spans):
+    """
+    Coroutine that records the cells of ``S`` for a single dialect in 
+    ``spans``.
+
+    The positions of the structural characters of the dialect (see 
+    ``structural_chars``) must be sent to the coroutine in increasing order, 
+    followed by None when the end of the text is reached. All other characters 
+    are plain cell content and are handled in bulk.
+    """
+    quote_cond = lambda c, q: q and c.startswith(q) and c.endswith(q)
+
+    def add_field(start, end, field):
+        # field is None if the cell is the slice S[start:end]
+        if field is None:
+            quoted = end > start and quotechar and S[start] == quotechar
+            if quoted and S[end - 1] == quotechar:
+                spans.add_cell(start + 1, max(start + 1, end - 1), True)
+            else:
+                spans.add_cell(start, end)
+        elif quote_cond(field, quotechar):
+            spans.add_cell(start, end, True, value=field[1:-1])
+        else:
+            spans.add_cell(start, end, False, value=field)
+
+    in_quotes = False
+    in_escape = False
+    row_empty = True
+    start = 0
+    field = None
+    prev = 0
+    while True:
+        i = yield
+        if i is None:
+            break
+        if i < prev:
+            # skipped second quote of a double quote
+            continue
+        if i > prev and (in_escape or not field is None):
+            if field is None:
+                field = S[start:prev]
+            if in_escape:
+                field += escapechar
+                in_escape = False
+            field += S[prev:i]
+        prev = i + 1
+
+        s = S[i]
+        if s == quotechar:
+            if in_escape:
+                in_escape = False
+            elif not in_quotes:
+                in_quotes = True
+            elif i + 1 < len(S) and S[i + 1] == quotechar:
+                if field is None:
+                    field = S[start:i]
+                prev = i + 2
+            else:
+                in_quotes = False
+            if not field is None:
+                field += s
+        elif s in ["\r", "\n"]:
+            if in_quotes:
+                if not field is None:
+                    field += s
+            elif row_empty and (start == i if field is None else field == ""):
+                if field is None:
+                    start = i + 1
+            else:
+                add_field(start, i, field)
+                spans.end_row()
+                row_empty = True
+                start = i + 1
+                field = None
+        elif s == delimiter:
+            if in_escape or in_quotes:
+                in_escape = False
+                if not field is None:
+                    field += s
+            else:
+                add_field(start, i, field)
+                row_empty = False
+                start = i + 1
+                field = None
+        else:
+            # escapechar
+            if field is None:
+                field = S[start:i]
+            if in_escape:
+                field += s
+                in_escape = False
+            else:
+                in_escape = True
+
+    n = len(S)
+    if n == 0:
+        return
+    if n > prev and (in_escape or not field is None):
+        if field is None:
+            field = S[start:prev]
+        if in_escape:
+            field += escapechar
+        field += S[prev:n]
+
+    s = S[-1]
+    content = S[start:n] if field is None else field
+    if in_quotes and not quote_cond(content, quotechar):
+        s = ""
+        if content.startswith(quotechar):
+            if field is None:
+                spans.add_cell(start + 1, n, True)
+            else:
+                spans.add_cell(start, n, True, value=field[1:])
+        else:
+            spans.add_cell(start, n, False, value=field)
+        spans.end_row()
+    elif not s in ["\r", "\n"]:
+        add_field(start, n, field)
+        spans.end_row()
+
+
+def parse_spans_multi(S, dialects, index=None):
+    """
+    Parse a CSV file with several dialects in a single pass over the text.
+
+    Returns a dict that maps every dialect to the CellSpans object that 
+    ``parse_spans`` would give. The text is scanned once for the union of the 
+    structural characters of all dialects, and every structural character is 
+    only passed on to the dialects for which it is structural. Plain content 
+    between structural characters is never visited, so the cost of the scan 
+    does not grow with the number of dialects.
+
+    >>> from common.dialect import Dialect
+    >>> dialects = [Dialect(',', '"', ''), Dialect(',', '', ''),
+    ...             Dialect(';', "'", '|'), Dialect('', '', '')]
+    >>> S = 'a,"b;c",d\\n\\'e;f\\'|;g,h\\r\\n"i""j"'
+    >>> res = parse_spans_multi(S, dialects)
+    >>> res[dialects[0]].to_list()
+    [['a', 'b;c', 'd'], ["'e;f'|;g", 'h'], ['i"j']]
+    >>> all(res[d] == parse_spans(S, dialect=d) for d in dialects)
+    True
+    >>> from common.structural import StructuralIndex
+    >>> index = StructuralIndex.from_dialects(S, dialects)
+    >>> parse_spans_multi(S, dialects, index=index) == res
+    True
+    """
+    results = {}
+    dispatch = {}
+    machines = []
+    for dialect in dialects:
+        if dialect in results:
+            continue
+        spans = CellSpans(S)
+        results[dialect] = spans
+        machine = _span_machine(
+            S, dialect.delimiter, dialect.quotechar, dialect.escapechar, spans
+        )
+        next(machine)
+        machines.append(machine)
+        specials = structural_chars(
+            dialect.delimiter, dialect.quotechar, dialect.escapechar
+        )
+        for c in specials:
+            dispatch.setdefault(c, []).append(machine.send)
+
+    if index is None:
+        structural = re.compile("|".join(map(re.escape, dispatch)))
+        positions = (m.start() for m in structural.finditer(S))
+    else:
+        positions = index.iter_positions(dispatch)
+    for i in positions:
+        for send in dispatch[S[i]]:
+            send(i)
+    for machine in machines:
+        _close_machine(machine)
+    return results
+
+
+def iter_spans(S, dialects, index=None, group_size=SPANS_GROUP_SIZE):
+    """
+    Iterate over the dialects and the CellSpans objects of their parses.
+
+    The dialects are parsed with ``parse_spans_multi`` in groups of 
+    ``group_size``, and the results of a group are handed out one at a time 
+    before the next group is parsed. A result is no longer referenced here 
+    once it is yielded, so if the caller drops it after use at most 
+    ``group_size`` parses are in memory at the same time.
+
+    >>> from common.dialect import Dialect
+    >>> dialects = [Dialect(',', '"', ''), Dialect(';', '', '')]
+    >>> for dialect, spans in iter_spans('a,"b;c"', dialects, group_size=1):
+    ...     print(dialect.delimiter, spans.to_list())
+    , [['a', 'b;c']]
+    ; [['a,"b', 'c"']]
+    """
+    dialects = list(dict.fromkeys(dialects))
+    for g in range(0, len(dialects), group_size):
+        group = dialects[g : g + group_size]
+        parsed = parse_spans_multi(S, group, index=index)
+        for dialect in group:
+            yield dialect, parsed.pop(dialect)
+
+
+def iter_rows(
+    stream,
+    dialect=None,
+    delimiter=None,
+    quotechar=None,
+    escapechar=None,
+    chunksize=CHUNK_SIZE,
+):
+    """
+    Iterate over the rows of a CSV file given as a text stream.
+
+    This is the streaming counterpart of ``parse_file``: the stream is read in 
+    blocks of ``chunksize`` characters and rows are yielded as soon as they 
+    are complete, so only the current row is kept in memory. The quote and 
+    escape state is carried across block boundaries, which means the result 
+    is identical to that of ``parse_file`` on the full text.
+
+    Tests
+    -----
+
+    >>> import io
+    >>> list(iter_rows(io.StringIO('a,b\\r\\nc,d'), delimiter=','))
+    [['a', 'b'], ['c', 'd']]
+    >>> list(iter_rows(io.StringIO('a,"b""c",d'), delimiter=',', quotechar='"', chunksize=4))
+    [['a', 'b"c', 'd']]
+    >>> list(iter_rows(io.StringIO('')))
+    []
+
+    """
+    if not dialect is None:
+        delimiter = dialect.delimiter if delimiter is None else delimiter
+        quotechar = dialect.quotechar if quotechar is None else quotechar
+        escapechar = dialect.escapechar if escapechar is None else escapechar
+
+    quote_cond = lambda c, q: q and c.startswith(q) and c.endswith(q)
+
+    in_quotes = False
+    in_escape = False
+    # parse_file looks ahead one character to recognize a double quote inside 
+    # a quoted block. Since the next character may be in the next chunk, we 
+    # record that a closing quote is pending and decide on the next character.
+    quote_pending = False
+    row = []
+    field = ""
+    s = None
+    while True:
+        chunk = stream.read(chunksize)
+        if not chunk:
+            break
+        for s in chunk:
+            if quote_pending:
+                quote_pending = False
+                if s == quotechar:
+                    continue
+                in_quotes = False
+
+            if s == quotechar:
+                if in_escape:
+                    in_escape = False
+                elif not in_quotes:
+                    in_quotes = True
+                else:
+                    quote_pending = True
+                field += s
+            elif s in ["\r", "\n"]:
+                if in_quotes:
+                    field += s
+                elif field == "" and row == []:
+                    pass
+                else:
+                    if quote_cond(field, quotechar):
+                        field = field[1:-1]
+                    row.append(field)
+                    field = ""
+                    yield row
+                    row = []
+            elif s == delimiter:
+                if in_escape:
+                    in_escape = False
+                    field += s
+                elif in_quotes:
+                    field += s
+                else:
+                    if quote_cond(field, quotechar):
+                        field = field[1:-1]
+                    row.append(field)
+                    field = ""
+            elif s == escapechar:
+                if in_escape:
+                    field += s
+                    in_escape = False
+                else:
+                    in_escape = True
+            else:
+                if in_escape:
+                    field += escapechar
+                    in_escape = False
+                field += s
+
+    if quote_pending:
+        in_quotes = False
+
+    if quote_cond(field, quotechar):
+        field = field[1:-1]
+    elif in_quotes:
+        if field.startswith(quotechar):
+            field = field[1:]
+        s = ""
+    if not s in ["\r", "\n", None]:
+        row.append(field)
+        yield row
+
+
+def table_fingerprint(
+    S, dialect=None, delimiter=None, quotechar=None, escapechar=None
+):
+    """
+    Compute the shape and a hash of the table obtained by parsing ``S``.
+
+    The fingerprint consists of the number of rows, the number of cells in 
+    each row, and a digest of the cell contents. Two dialects give the same 
+    table if and only if their fingerprints are equal (up to hash collisions 
+    of blake2b), so tables can be compared without keeping them in memory.
+
+    >>> A = table_fingerprint('a,"b",c\\nd,e', delimiter=',', quotechar='"')
+    >>> B = table_fingerprint('a,"b",c\\nd,e', delimiter=',', quotechar='')
+    >>> A.n_rows, list(A.row_lengths)
+    (2, [3, 2])
+    >>> A == B
+    False
+    >>> A.row_lengths == B.row_lengths
+    True
+    >>> A == table_fingerprint('a,b,c\\rd,e', delimiter=',', quotechar='"')
+    True
+
+    Cell boundaries are part of the digest:
+
+    >>> (table_fingerprint('ab,c', delimiter=',').digest
+    ...  == table_fingerprint('a,bc', delimiter=',').digest)
+    False
+    """
+    spans = parse_spans(
+        S,
+        dialect=dialect,
+        delimiter=delimiter,
+        quotechar=quotechar,
+        escapechar=escapechar,
+    )
+    return spans.fingerprint()
+
+
+def first_difference(S, dialect_a, dialect_b, index=None):
+    """
+    Find the first cell that differs between two parses of ``S``.
+
+    Both dialects are parsed with ``parse_spans_multi`` and the cells are 
+    compared row by row until the first position where they differ, which is 
+    returned as a tuple. Cells with the same offsets in ``S`` are equal, so 
+    these aren't turned into strings. If all cells are the same, None is 
+    returned. Only the cells up to the length of the shorter row are compared, 
+    so the shape of the tables should be compared separately (for instance 
+    with ``table_fingerprint``).
+
+    >>> from common.dialect import Dialect
+    >>> first_difference('a,b|,c,d', Dialect(',', '', ''), Dialect(',', '', '|'))
+    ('b|', 'b,c')
+    >>> first_difference('a,"b",c', Dialect(',', '"', ''), Dialect(',', '"', '|'))
+    """
+    parsed = parse_spans_multi(S, [dialect_a, dialect_b], index=index)
+    A, B = parsed[dialect_a], parsed[dialect_b]
+    start_a = start_b = 0
+    for end_a, end_b in zip(A.row_ends, B.row_ends):
+        for k, l in zip(range(start_a, end_a), range(start_b, end_b)):
+            if (
+                A.starts[k] == B.starts[l]
+                and A.ends[k] == B.ends[l]
+                and not k in A.special
+                and not l in B.special
+            ):
+                continue
+            u, v = A.cell(k), B.cell(l)
+            if u != v:
+                return (u, v)
+        start_a, start_b = end_a, end_b
+    return None
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Index of the structural characters in a file
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+"""
+
+import heapq
+import re
+
+from array import array
+
+NEWLINES = ["\r", "\n"]
+
+
+def structural_chars(delimiter, quotechar, escapechar):
+    """ The characters that are not plain cell content for a dialect """
+    specials = []
+    for c in [quotechar] + NEWLINES + [delimiter, escapechar]:
+        if c and not c in specials:
+            specials.append(c)
+    return specials
+
+
+class StructuralIndex(object):
+    """
+    Sorted positions of the potential structural characters in a text.
+
+    The index is built once per file for all characters that are delimiter, 
+    quote character, or escape character in any of the candidate dialects 
+    (and for the newline characters). Dialect-specific passes over the text 
+    can then visit only the positions of their own structural characters and 
+    skip the plain content in between.
+
+    >>> index = StructuralIndex('a,"b";c\\r\\nd', [',', '"', ';'])
+    >>> list(index.positions(','))
+    [1]
+    >>> list(index.iter_positions([',', '"', '\\r', '\\n']))
+    [1, 2, 4, 7, 8]
+
+    Characters that were not indexed up front are added on demand:
+
+    >>> list(index.positions('d'))
+    [9]
+    """
+
+    def __init__(self, S, chars):
+        self.S = S
+        self._positions = {}
+        chars = set(c for c in chars if c)
+        chars.update(NEWLINES)
+        for c in chars:
+            self._positions[c] = array("l")
+        pattern = re.compile("|".join(map(re.escape, sorted(chars))))
+        for m in pattern.finditer(S):
+            self._positions[m.group()].append(m.start())
+
+    @classmethod
+    def from_dialects(cls, S, dialects):
+        chars = set()
+        for d in dialects:
+            chars.update([d.delimiter, d.quotechar, d.escapechar])
+        return cls(S, chars)
+
+    def positions(self, char):
+        if not char in self._positions:
+            pos = array("l")
+            i = self.S.find(char)
+            while i > -1:
+                pos.append(i)
+                i = self.S.find(char, i + 1)
+            self._positions[char] = pos
+        return self._positions[char]
+
+    def iter_positions(self, chars):
+        """ Iterate over the positions of the given characters in order """
+        arrays = [self.positions(c) for c in set(chars) if c]
+        if len(arrays) == 1:
+            return iter(arrays[0])
+        return heapq.merge(*arrays)
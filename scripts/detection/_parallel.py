@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Code for scoring the dialects of files with a pool of processes.
+
+The pool is created once and used for all files of a run. The text of a file
+is placed in shared memory once, and every worker decodes it when it gets its
+first task for that file, so the data is not sent along with every dialect.
+The best score found so far is shared between the workers, so the type
+scores can still be skipped or stopped early for dialects that can't beat it.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import multiprocessing
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from common.structural import StructuralIndex
+
+from ._types import (
+    add_type_cache_counts,
+    clear_cell_types,
+    enable_type_cache,
+    type_cache_counts,
+    type_cache_stats,
+)
+
+# State of a worker process. _BEST is set by _init_worker(), the others by
+# _load_file() for the file of the current task.
+_FILE_ID = None
+_DATA = None
+_INDEX = None
+_BEST = None
+
+
+def _init_worker(best, type_cache):
+    global _BEST
+    _BEST = best
+    if type_cache:
+        enable_type_cache(type_cache)
+
+
+def _load_file(file):
+    global _FILE_ID, _DATA, _INDEX
+    name, size, file_id, chars = file
+    if file_id == _FILE_ID:
+        return
+    # the memo of cell types is per file, as in the serial code
+    clear_cell_types()
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        _DATA = bytes(shm.buf[:size]).decode("utf-8", "surrogatepass")
+    finally:
+        shm.close()
+    _INDEX = StructuralIndex(_DATA, chars)
+    _FILE_ID = file_id
+
+
+def _pattern_task(args):
+    file, get_pattern_score, dialect = args
+    _load_file(file)
+    return get_pattern_score(_DATA, dialect, index=_INDEX)
+
+
+def _type_task(args):
+    file, get_type_score, dialect, pattern_score = args
+    _load_file(file)
+    before = type_cache_counts()
+    type_score = get_type_score(
+        _DATA,
+        dialect,
+        index=_INDEX,
+        pattern_score=pattern_score,
+        max_score=_BEST.value,
+    )
+    if not type_score is None:
+        with _BEST.get_lock():
+            _BEST.value = max(_BEST.value, type_score * pattern_score)
+    counts = [b - a for a, b in zip(before, type_cache_counts())]
+    return dialect, type_score, counts
+
+
+class DialectPool(object):
+    """
+    Pool of processes that score the candidate dialects of files.
+
+    The pool is meant to be created once and used for every file, and must be
+    closed after use (it is also a context manager). The shared memory for
+    the text is reused for the next file, and only grows when a file doesn't
+    fit.
+    """
+
+    def __init__(self, n_jobs=None):
+        # The workers must share the resource tracker of this process, as
+        # their own trackers would remove the shared memory when they exit.
+        resource_tracker.ensure_running()
+        self._best = multiprocessing.Value("d", -float("inf"))
+        # the workers get a type cache of their own if it is enabled here
+        stats = type_cache_stats()
+        type_cache = None if stats is None else stats["maxsize"]
+        self._pool = multiprocessing.Pool(
+            n_jobs,
+            initializer=_init_worker,
+            initargs=(self._best, type_cache),
+        )
+        self._shm = None
+        self._file_id = 0
+
+    def _put_file(self, data, dialects):
+        encoded = data.encode("utf-8", "surrogatepass")
+        if self._shm is None or self._shm.size < len(encoded):
+            self._release()
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=max(1, len(encoded))
+            )
+        self._shm.buf[: len(encoded)] = encoded
+        self._file_id += 1
+        chars = set()
+        for d in dialects:
+            chars.update([d.delimiter, d.quotechar, d.escapechar])
+        return (self._shm.name, len(encoded), self._file_id, chars)
+
+    def _release(self):
+        if not self._shm is None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def score(
+        self,
+        data,
+        dialects,
+        get_pattern_score,
+        get_type_score=None,
+        max_score=-float("inf"),
+    ):
+        """
+        Compute the pattern scores and the type scores of the dialects.
+
+        The pattern scores are computed first, and the type scores are then
+        computed in order of decreasing pattern score. The score functions
+        must be defined at module level, as they are sent to the workers.
+        ``get_type_score`` returns None when the dialect can't beat the best
+        score, which starts at ``max_score``. Without a type score function
+        only the pattern scores are computed. Returns the dicts of the
+        pattern scores and the type scores.
+
+        >>> from common.dialect import Dialect
+        >>> from detection.our_score_full import get_pattern_score
+        >>> from detection.our_score_full import get_dialect_type_score
+        >>> data = '1;a,b,c\\n2;d,e,f'
+        >>> dialects = [Dialect(',', '', ''), Dialect(';', '', '')]
+        >>> with DialectPool(2) as pool:
+        ...     p, t = pool.score(data, dialects, get_pattern_score,
+        ...         get_dialect_type_score)
+        ...     q, _ = pool.score(data[::-1], dialects, get_pattern_score)
+        >>> p == {d: get_pattern_score(data, d) for d in dialects}
+        True
+        >>> t == {d: get_dialect_type_score(data, d) for d in dialects}
+        True
+        >>> q == {d: get_pattern_score(data[::-1], d) for d in dialects}
+        True
+        """
+        dialects = sorted(dialects)
+        file = self._put_file(data, dialects)
+        tasks = [(file, get_pattern_score, d) for d in dialects]
+        pattern_scores = dict(
+            zip(dialects, self._pool.map(_pattern_task, tasks))
+        )
+        if get_type_score is None:
+            return pattern_scores, {}
+
+        self._best.value = max_score
+        order = sorted(pattern_scores, key=pattern_scores.get, reverse=True)
+        tasks = [(file, get_type_score, d, pattern_scores[d]) for d in order]
+        type_scores = {}
+        for dialect, type_score, counts in self._pool.imap_unordered(
+            _type_task, tasks
+        ):
+            type_scores[dialect] = type_score
+            # the lookups in the type cache of the workers are counted here
+            add_type_cache_counts(counts)
+        return pattern_scores, type_scores
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not exc_type is None:
+            self._pool.terminate()
+        self.close()
@@ -11,22 +11,38 @@ Date: 2018-10-30
 
 """
 
-from common.parser import parse_file
+from common.parser import first_difference, parse_spans_multi
 from common.utils import pairwise
 
 
-def break_ties_two(data, A, B):
+def get_fingerprints(data, dialects, fingerprints):
+    """
+    Get the table fingerprints, parsing missing dialects in one pass.
+
+    The tie breaking functions may compare the same dialect several times, so
+    the fingerprints of the tables of ``data`` are kept in the dict
+    ``fingerprints``, which is created by break_ties().
+    """
+    missing = [d for d in dialects if not d in fingerprints]
+    if missing:
+        for dialect, spans in parse_spans_multi(data, missing).items():
+            fingerprints[dialect] = spans.fingerprint()
+    return [fingerprints[d] for d in dialects]
+
+
+def break_ties_two(data, A, B, fingerprints=None):
     """
     Break ties between dialects A and B.
 
     """
+    if fingerprints is None:
+        fingerprints = {}
     if A.delimiter == B.delimiter and A.escapechar == B.escapechar:
         if A.quotechar == "" or B.quotechar == "":
             d_no = A if A.quotechar == "" else B
             d_yes = B if d_no == A else A
 
-            X = parse_file(data, dialect=d_no)
-            Y = parse_file(data, dialect=d_yes)
+            X, Y = get_fingerprints(data, [d_no, d_yes], fingerprints)
 
             if X == Y:
                 # quotechar has no effect
@@ -50,25 +66,18 @@ def break_ties_two(data, A, B):
     elif A.delimiter == B.delimiter and A.quotechar == B.quotechar:
         Dnone, Descape = (A, B) if A.escapechar == "" else (B, A)
 
-        X = parse_file(data, Dnone)
-        Y = parse_file(data, Descape)
+        X, Y = get_fingerprints(data, [Dnone, Descape], fingerprints)
 
         # double check shape. Usually if the shape differs the pattern score
         # should have caught it, but if by a freakish occurance it hasn't then
         # we can't break this tie (for now)
-        if len(X) != len(Y):
+        if X.row_lengths != Y.row_lengths:
             return None
-        for x, y in zip(X, Y):
-            if len(x) != len(y):
-                return None
-
-        cells_escaped = []
-        cells_unescaped = []
-        for x, y in zip(X, Y):
-            for u, v in zip(x, y):
-                if u != v:
-                    cells_unescaped.append(u)
-                    cells_escaped.append(v)
+
+        # Only the first offending cell is needed below, so we stop parsing 
+        # as soon as it is found.
+        diff = first_difference(data, Dnone, Descape)
+        cells_unescaped = [] if diff is None else [diff[0]]
 
         # We will break the ties in the following ways:
         #
@@ -92,9 +101,11 @@ def break_ties_two(data, A, B):
     return None
 
 
-def break_ties_three(data, A, B, C):
+def break_ties_three(data, A, B, C, fingerprints=None):
     # NOTE: We have only observed one tie for each case during development, so
     # this may need to be improved in the future.
+    if fingerprints is None:
+        fingerprints = {}
     equal_delim = A.delimiter == B.delimiter == C.delimiter
     equal_escape = A.escapechar == B.escapechar == C.escapechar
 
@@ -113,17 +124,18 @@ def break_ties_three(data, A, B, C):
         if any((d is None for d in [d_none, d_single, d_double])):
             return None
 
-        r_none = parse_file(data, d_none)
-        r_single = parse_file(data, d_single)
-        r_double = parse_file(data, d_double)
+        r_none, r_single, r_double = get_fingerprints(
+            data, [d_none, d_single, d_double], fingerprints
+        )
 
-        if len(r_none) != len(r_single) or len(r_none) != len(r_double):
+        n_rows = r_none.n_rows
+        if n_rows != r_single.n_rows or n_rows != r_double.n_rows:
             return None
 
         if r_none == r_single:
-            return break_ties_two(data, d_none, d_double)
+            return break_ties_two(data, d_none, d_double, fingerprints)
         elif r_none == r_double:
-            return break_ties_two(data, d_none, d_single)
+            return break_ties_two(data, d_none, d_single, fingerprints)
     elif equal_delim:
         # difference is in quotechar *and* escapechar
 
@@ -141,25 +153,29 @@ def break_ties_three(data, A, B, C):
         if len(with_quote) != 2:
             return None
 
-        return break_ties_two(data, with_quote[0], with_quote[1])
+        return break_ties_two(
+            data, with_quote[0], with_quote[1], fingerprints
+        )
 
     return None
 
 
-def break_ties_four(data, dialects):
+def break_ties_four(data, dialects, fingerprints=None):
     # NOTE: We have only observed one case during development where this
     # function was needed. It may need to be revisited in the future if other
     # examples are found.
 
+    if fingerprints is None:
+        fingerprints = {}
     equal_delim = len(set([d.delimiter for d in dialects])) == 1
     if not equal_delim:
         return None
 
     # First, identify dialects that result in the same parsing result.
+    get_fingerprints(data, dialects, fingerprints)
     equal_dialects = []
     for a, b in pairwise(dialects):
-        X = parse_file(data, a)
-        Y = parse_file(data, b)
+        X, Y = get_fingerprints(data, [a, b], fingerprints)
         if X == Y:
             equal_dialects.append((a, b))
 
@@ -167,7 +183,7 @@ def break_ties_four(data, dialects):
     new_dialects = set()
     visited = set()
     for A, B in equal_dialects:
-        ans = break_ties_two(data, A, B)
+        ans = break_ties_two(data, A, B, fingerprints)
         if not ans is None:
             new_dialects.add(ans)
         visited.add(A)
@@ -180,18 +196,22 @@ def break_ties_four(data, dialects):
 
     # Defer to other functions if the number of dialects was reduced
     if len(dialects) == 2:
-        return break_ties_two(data, *dialects)
+        return break_ties_two(data, *dialects, fingerprints)
     elif len(dialects) == 3:
-        return break_ties_three(data, *dialects)
+        return break_ties_three(data, *dialects, fingerprints)
 
     return None
 
 
 def break_ties(data, dialects):
+    # the fingerprints of the tables are shared by the comparisons below
+    fingerprints = {}
     if len(dialects) == 2:
-        return break_ties_two(data, dialects[0], dialects[1])
+        return break_ties_two(data, dialects[0], dialects[1], fingerprints)
     elif len(dialects) == 3:
-        return break_ties_three(data, dialects[0], dialects[1], dialects[2])
+        return break_ties_three(
+            data, dialects[0], dialects[1], dialects[2], fingerprints
+        )
     elif len(dialects) == 4:
-        return break_ties_four(data, dialects)
+        return break_ties_four(data, dialects, fingerprints)
     return None
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memo of the types of the cells of a file.
+
+The candidate dialects of a file mostly give the same cells, and cell values
+are often repeated within a file, so every distinct value is only evaluated
+once. The memo is cleared by the detectors after every file, and it holds at
+most MEMO_SIZE values of at most MAX_CACHED_LENGTH characters, so a large file
+can't make it grow without bounds.
+
+Values that are common across files (empty cells, "0", "NA", dates, etc.) can
+also be kept in an optional cache that is shared by all files in the process.
+This cache has a bounded size and drops the least recently used values first.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+from collections import OrderedDict
+
+from .lib.types.rudi_types import eval_types
+
+# Longer cell values are not kept in the memo or the cache, so their memory
+# use is bounded
+MAX_CACHED_LENGTH = 128
+
+# Number of values in the memo of the current file
+MEMO_SIZE = 100000
+
+_TYPE_CACHE = None
+
+
+class LRUCache(object):
+    """Mapping of bounded size that drops the least recently used keys
+
+    >>> c = LRUCache(2)
+    >>> c.put('a', 1); c.put('b', 2)
+    >>> c.get('a')
+    1
+    >>> c.put('c', 3)
+    >>> c.get('b', 'missing')
+    'missing'
+    >>> sorted(c.stats().items())
+    [('evictions', 1), ('hits', 1), ('maxsize', 2), ('misses', 1), ('size', 2)]
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+_CELL_TYPES = LRUCache(MEMO_SIZE)
+
+
+def enable_type_cache(maxsize=100000):
+    """ Enable the process-wide cache of cell types """
+    global _TYPE_CACHE
+    _TYPE_CACHE = LRUCache(maxsize)
+
+
+def disable_type_cache():
+    global _TYPE_CACHE
+    _TYPE_CACHE = None
+
+
+def type_cache_stats():
+    """ Get the counters of the type cache, or None if it is disabled """
+    if _TYPE_CACHE is None:
+        return None
+    return _TYPE_CACHE.stats()
+
+
+def type_cache_counts():
+    """ Get the hits, misses, and evictions of the type cache """
+    if _TYPE_CACHE is None:
+        return (0, 0, 0)
+    return (_TYPE_CACHE.hits, _TYPE_CACHE.misses, _TYPE_CACHE.evictions)
+
+
+def add_type_cache_counts(counts):
+    """Add counts of type_cache_counts() from another process to the cache
+
+    The process pool uses this for the lookups of its workers, which have a
+    copy of the cache. The size of the cache is still that of this process.
+    """
+    if _TYPE_CACHE is None:
+        return
+    hits, misses, evictions = counts
+    _TYPE_CACHE.hits += hits
+    _TYPE_CACHE.misses += misses
+    _TYPE_CACHE.evictions += evictions
+
+
+def format_type_cache_stats():
+    stats = type_cache_stats()
+    if stats is None:
+        return "Type cache: disabled"
+    lookups = stats["hits"] + stats["misses"]
+    return (
+        "Type cache: hits = %i\tmisses = %i\tevictions = %i\tsize = %i/%i"
+        "\thit rate = %.3f"
+        % (
+            stats["hits"],
+            stats["misses"],
+            stats["evictions"],
+            stats["size"],
+            stats["maxsize"],
+            stats["hits"] / lookups if lookups else 0,
+        )
+    )
+
+
+def _eval_cached(cell):
+    if _TYPE_CACHE is None or len(cell) > MAX_CACHED_LENGTH:
+        return eval_types(cell)
+    # eval_types() returns None for cells without a type, so we need a
+    # different marker for values that aren't in the cache
+    detected_type = _TYPE_CACHE.get(cell, _TYPE_CACHE)
+    if detected_type is _TYPE_CACHE:
+        detected_type = eval_types(cell)
+        _TYPE_CACHE.put(cell, detected_type)
+    return detected_type
+
+
+def get_cell_type(cell):
+    """ Get the type of a cell with eval_types() """
+    if len(cell) > MAX_CACHED_LENGTH:
+        return eval_types(cell)
+    detected_type = _CELL_TYPES.get(cell, _CELL_TYPES)
+    if detected_type is _CELL_TYPES:
+        detected_type = _eval_cached(cell)
+        _CELL_TYPES.put(cell, detected_type)
+    return detected_type
+
+
+def clear_cell_types():
+    _CELL_TYPES.clear()
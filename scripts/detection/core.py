@@ -12,17 +12,18 @@ License: See the LICENSE file.
 import os
 import json
 import time
+import inspect
 import argparse
-import codecs
+import functools
 import unicodedata
 
 from tqdm import tqdm
 
+from common.chars import CharTable
 from common.detector_result import DetectorResult, Status, StatusMsg
 
 
-def can_be_delim_unicode(char, encoding=None):
-    as_unicode = codecs.decode(bytes(char, encoding), encoding=encoding)
+def _can_be_delim_unicode(as_unicode):
     ctr = unicodedata.category(as_unicode)
     if ctr in ["Lu", "Ll", "Lt", "Lm", "Lo"]:
         return False
@@ -50,6 +51,12 @@ def can_be_delim_unicode(char, encoding=None):
     return True
 
 
+_DELIMS = CharTable(_can_be_delim_unicode)
+
+
+def can_be_delim_unicode(char, encoding=None):
+    return _DELIMS(char, encoding)
+
 
 def get_potential_quotechars(data):
     quotechars = set([""])
@@ -132,6 +139,28 @@ def parse_args():
     parser.add_argument(
         "-p", "--progress", dest="progress", action="store_true"
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="n_jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to score the dialects of a file",
+    )
+    parser.add_argument(
+        "--type-cache",
+        dest="type_cache",
+        type=int,
+        default=0,
+        help="Size of the cache of cell types that is shared by all files",
+    )
+    parser.add_argument(
+        "--type-sample",
+        dest="type_sample",
+        type=int,
+        default=0,
+        help="Number of cells sampled to estimate a type score (0 for exact scores)",
+    )
     parser.add_argument(
         "input_file",
         help="Input file can be a file of paths to CSV file, or the path of a single CSV file. If the former, output_file must be set",
@@ -145,8 +174,39 @@ def parse_args():
     return parser.parse_args()
 
 
+def _check_supports(determine_dqr, detector, param, option):
+    if not param in inspect.signature(determine_dqr).parameters:
+        raise SystemExit(
+            "Detector %s doesn't support the %s option" % (detector, option)
+        )
+
+
 def run(determine_dqr, detector):
     args = parse_args()
+    if args.type_cache > 0:
+        # imported here, since not all detectors use the type detection
+        from ._types import enable_type_cache
+
+        enable_type_cache(args.type_cache)
+    if args.type_sample > 0:
+        _check_supports(
+            determine_dqr, detector, "sample_size", "--type-sample"
+        )
+        determine_dqr = functools.partial(
+            determine_dqr, sample_size=args.type_sample
+        )
+    if args.n_jobs <= 1:
+        return _run(args, determine_dqr, detector)
+    _check_supports(determine_dqr, detector, "pool", "-j/--jobs")
+    # imported here, since the pool is only used by some detectors
+    from ._parallel import DialectPool
+
+    # The pool is shared by all files of the run.
+    with DialectPool(args.n_jobs) as pool:
+        _run(args, functools.partial(determine_dqr, pool=pool), detector)
+
+
+def _run(args, determine_dqr, detector):
     if args.output_file is None:
         print(determine_dqr(args.input_file, verbose=args.verbose))
     else:
@@ -17,9 +17,8 @@ import os
 import sys
 import time
 
-from common.encoding import get_encoding
 from common.escape import is_potential_escapechar
-from common.load import load_file
+from common.load import load_file_with_encoding
 from common.detector_result import DetectorResult, Dialect, Status, StatusMsg
 from common.utils import pairwise
 
@@ -253,8 +252,7 @@ def ask_dqe(
 
 def annotate_file(filename, less_pane, previous):
     print("")
-    encoding = get_encoding(filename)
-    data = load_file(filename, encoding=encoding)
+    encoding, data = load_file_with_encoding(filename)
 
     if previous:
         ask_delim = not "delimiter" in previous
@@ -45,6 +45,39 @@ STRIP_WHITESPACE = True
 TO_CHECK = []
 CHECK_ALL = False
 
+
+class LazyRegex(object):
+    """A regex that is only compiled when it is first used
+
+    This keeps the import of this module fast, as there are many patterns.
+
+    >>> pat = LazyRegex("a+b")
+    >>> pat.pattern
+    'a+b'
+    >>> pat.fullmatch("aab") is not None
+    True
+    >>> pat.groups, pat._compiled is pat.split.__self__
+    (0, True)
+    """
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    def __getattr__(self, name):
+        # This is only called for attributes that aren't set. The regex is
+        # compiled once, and its common methods are set on the instance so
+        # they are looked up directly after the first use.
+        if name.startswith("__") or name == "_compiled":
+            raise AttributeError(name)
+        if self._compiled is None:
+            self._compiled = regex.compile(self.pattern, self.flags)
+            for method in ["fullmatch", "match", "search", "finditer", "sub"]:
+                setattr(self, method, getattr(self._compiled, method))
+        return getattr(self._compiled, name)
+
+
 # Used this site: https://unicode-search.net/unicode-namesearch.pl
 SPECIALS_ALLOWED = [
     # Periods
@@ -101,33 +134,33 @@ SPECIALS_ALLOWED = [
 ]
 
 PATTERNS = {
-    "number_1": regex.compile(
+    "number_1": LazyRegex(
         "(?=[+-\.\d])[+-]?(?:0|[1-9]\d*)?(((?P<dot>\.)?(?(dot)(?P<yes_dot>\d*(\d+[eE][+-]?\d+)?)|(?P<no_dot>([eE][+-]?\d+)?)))|((?P<comma>,)?(?(comma)(?P<yes_comma>\d+(\d+[eE][+-]?\d+)?)|(?P<no_comma>([eE][+-]?\d+)?))))"
     ),
-    "number_2": regex.compile("[+-]?(?:[1-9]|[1-9]\d{0,2})(?:\,\d{3})+\.\d*"),
-    "number_3": regex.compile("[+-]?(?:[1-9]|[1-9]\d{0,2})(?:\.\d{3})+\,\d*"),
-    "url": regex.compile(
+    "number_2": LazyRegex("[+-]?(?:[1-9]|[1-9]\d{0,2})(?:\,\d{3})+\.\d*"),
+    "number_3": LazyRegex("[+-]?(?:[1-9]|[1-9]\d{0,2})(?:\.\d{3})+\,\d*"),
+    "url": LazyRegex(
         "(?:(?:[A-Za-z]{3,9}:(?:\/\/)?)(?:[-;:&=\+\$,\w]+@)?[A-Za-z0-9.-]+|(?:www.|[-;:&=\+\$,\w]+@)[A-Za-z0-9.-]+)(?:(?:\/[\+~%\/.\w\-_]*)?\??(?:[-\+=&;%@.\w_]*)#?(?:[\w]*))?"
     ),
-    "email": regex.compile(
+    "email": LazyRegex(
         r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)"
     ),
-    "unicode_alphanum": regex.compile(
+    "unicode_alphanum": LazyRegex(
         "(\p{N}+\p{L}+[\p{N}\p{L}\ "
         + regex.escape("".join(SPECIALS_ALLOWED))
         + "]*|\p{L}+[\p{N}\p{L}\ "
         + regex.escape("".join(SPECIALS_ALLOWED))
         + "]+)"
     ),
-    "time_hhmmss": regex.compile(
+    "time_hhmmss": LazyRegex(
         "(0[0-9]|1[0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])"
     ),
-    "time_hhmm": regex.compile("(0[0-9]|1[0-9]|2[0-3]):([0-5][0-9])"),
-    "time_HHMM": regex.compile("(0[0-9]|1[0-9]|2[0-3])([0-5][0-9])"),
-    "time_HH": regex.compile("(0[0-9]|1[0-9]|2[0-3])([0-5][0-9])"),
-    "time_hmm": regex.compile("([0-9]|1[0-9]|2[0-3]):([0-5][0-9])"),
-    "currency": regex.compile("\p{Sc}\s?(.*)"),
-    "unix_path": regex.compile(
+    "time_hhmm": LazyRegex("(0[0-9]|1[0-9]|2[0-3]):([0-5][0-9])"),
+    "time_HHMM": LazyRegex("(0[0-9]|1[0-9]|2[0-3])([0-5][0-9])"),
+    "time_HH": LazyRegex("(0[0-9]|1[0-9]|2[0-3])([0-5][0-9])"),
+    "time_hmm": LazyRegex("([0-9]|1[0-9]|2[0-3]):([0-5][0-9])"),
+    "currency": LazyRegex("\p{Sc}\s?(.*)"),
+    "unix_path": LazyRegex(
         "[\/~]{1,2}(?:[a-zA-Z0-9\.]+(?:[\/]{1,2}))+(?:[a-zA-Z0-9\.]+)"
     ),
 }
@@ -159,7 +192,7 @@ def load_date_patterns():
                 pat_ko = "{year}년{month}월{day}일".format(**fmt)
 
                 for pattern in [pat_1, pat_2, pat_3, pat_cn, pat_ko]:
-                    PATTERNS["date_%i" % counter] = regex.compile(pattern)
+                    PATTERNS["date_%i" % counter] = LazyRegex(pattern)
                     counter += 1
 
     # These should be allowed as dates, but are also numbers.
@@ -175,7 +208,7 @@ def load_date_patterns():
         pat_3 = "{month}{sep}{day}{sep}{year}".format(**fmt)
 
         for pattern in [pat_1, pat_2, pat_3, pat_cn]:
-            PATTERNS["date_%i" % counter] = regex.compile(pattern)
+            PATTERNS["date_%i" % counter] = LazyRegex(pattern)
             counter += 1
 
 
@@ -266,6 +299,10 @@ def test_currency(cell):
 
 
 def test_datetime(cell):
+    return _test_datetime(cell, test_date, test_time)
+
+
+def _test_datetime(cell, test_date, test_time):
     # Takes care of cells with '[date] [time]' and '[date]T[time]' (iso)
     if " " in cell:
         parts = cell.split(" ")
@@ -319,27 +356,7 @@ def test_nan(cell):
     return False
 
 
-def eval_types(cell, break_away=True):
-    type_tests = [
-        ("empty", test_empty),
-        ("url_or_email", test_url_or_email),
-        ("number", test_number),
-        ("time", test_time),
-        ("percentage", test_percentage),
-        ("currency", test_currency),
-        ("unicode_alphanum", test_unicode_alphanum),
-        ("nan", test_nan),
-        ("date", test_date),
-        ("datetime", test_datetime),
-    ]
-
-    detected = []
-    for name, func in type_tests:
-        if func(cell):
-            detected.append(name)
-            if break_away:
-                break
-
+def _check_detected(cell, detected):
     if len(detected) > 1:
         print(
             "Type tests aren't mutually exclusive!\nCell: %r\nTypes: %r"
@@ -350,3 +367,308 @@ def eval_types(cell, break_away=True):
     if len(detected) == 0:
         return None
     return detected[0]
+
+
+# The patterns that are tested together are combined into a single
+# alternation, which fully matches a cell if and only if one of the patterns
+# does.
+
+COMBINED_PATTERNS = {
+    "url_or_email": ["url", "email"],
+    "time": ["time_hmm", "time_hhmm", "time_hhmmss"],
+    "date": [name for name in PATTERNS if name.startswith("date_")],
+}
+
+COMBINED = {
+    key: LazyRegex(
+        "|".join("(?:%s)" % PATTERNS[name].pattern for name in names)
+    )
+    for key, names in COMBINED_PATTERNS.items()
+}
+
+
+# Recognizer for the numbers of the number_1, number_2, and number_3 patterns
+# that doesn't use the regex engine. These numbers have an optional sign, an
+# integer part, and either a radix point or comma with a fraction, an
+# exponent, or both, or they group the thousands with commas or periods. Note
+# that \d in the patterns also matches non-ASCII digits.
+
+_ASCII_DIGITS = "0123456789"
+_DIGITS = {}
+
+
+def _is_digit(char):
+    if "0" <= char <= "9":
+        return True
+    if char < "\x80":
+        return False
+    try:
+        return _DIGITS[char]
+    except KeyError:
+        is_digit = _DIGITS[char] = regex.match(r"\d", char) is not None
+        return is_digit
+
+
+def _skip_digits(s, i):
+    """ Index of the first character at or after i that isn't a digit """
+    n = len(s)
+    while True:
+        i = n - len(s[i:].lstrip(_ASCII_DIGITS))
+        if i < n and s[i] >= "\x80" and _is_digit(s[i]):
+            i += 1
+        else:
+            return i
+
+
+def _scan_exponent(s, i):
+    # [+-]?\d+ up to the end, after the [eE]
+    if i < len(s) and s[i] in "+-":
+        i += 1
+    j = _skip_digits(s, i)
+    return j > i and j == len(s)
+
+
+def _scan_grouped(s, i):
+    # [1-9]\d{0,2}(?:,\d{3})+\.\d* or [1-9]\d{0,2}(?:\.\d{3})+,\d*
+    n = len(s)
+    if not (i < n and "1" <= s[i] <= "9"):
+        return False
+    j = _skip_digits(s, i + 1)
+    if j - i > 3 or j == n or not s[j] in ",.":
+        return False
+    sep = s[j]
+    radix = "." if sep == "," else ","
+    while j < n and s[j] == sep:
+        k = _skip_digits(s, j + 1)
+        if k - j - 1 != 3:
+            return False
+        j = k
+    if j == n or s[j] != radix:
+        return False
+    return _skip_digits(s, j + 1) == n
+
+
+def scan_number(s):
+    """
+    Test if a (stripped) cell fully matches one of the number patterns.
+
+    >>> [scan_number(s) for s in ["1.5e3", "1,5", "-.5", "1,234,567.8", "01"]]
+    [True, True, True, True, False]
+    """
+    n = len(s)
+    if n == 0 or not (s[0] in "+,-." or _is_digit(s[0])):
+        return False
+    i = 1 if s[0] in "+-" else 0
+
+    # integer part, 0|[1-9]\d*, which is optional
+    j = i
+    if j < n and s[j] == "0":
+        j += 1
+    elif j < n and "1" <= s[j] <= "9":
+        j = _skip_digits(s, j + 1)
+    if j == n:
+        return True
+
+    c = s[j]
+    if c in "eE":
+        return _scan_exponent(s, j + 1)
+    if c in ".,":
+        # \.\d*, \.\d+[eE][+-]?\d+, ,\d+, or ,\d{2,}[eE][+-]?\d+
+        k = _skip_digits(s, j + 1)
+        m = k - j - 1
+        if k == n:
+            if c == "." or m >= 1:
+                return True
+        elif (
+            s[k] in "eE"
+            and m >= (1 if c == "." else 2)
+            and _scan_exponent(s, k + 1)
+        ):
+            return True
+    return _scan_grouped(s, i)
+
+
+def _strip(cell):
+    return cell.strip() if STRIP_WHITESPACE else cell
+
+
+def _is_number(cell):
+    return cell != "" and scan_number(_strip(cell))
+
+
+def _is_time(cell):
+    return COMBINED["time"].fullmatch(_strip(cell)) is not None
+
+
+def _is_date(cell):
+    if _is_number(cell):
+        return False
+    return COMBINED["date"].fullmatch(_strip(cell)) is not None
+
+
+# The characters that a cell can start with for the types that are tested with
+# a regex, derived from the patterns. These are used for a table of the types
+# that are possible for the first character of a cell, so that the tests that
+# can't succeed don't have to be run.
+
+FIRST_CHARS = {
+    "url_or_email": LazyRegex(r"[-;:&=+$,.\w]"),
+    "number": LazyRegex(r"[+,\-.\d]"),
+    "time": LazyRegex(r"[0-9]"),
+    "currency": LazyRegex(r"\p{Sc}"),
+    "unicode_alphanum": LazyRegex(r"[\p{N}\p{L}]"),
+    "date": LazyRegex(r"\d"),
+}
+
+_DISPATCH = {}
+
+
+def _fill_dispatch():
+    # the table is filled for Latin-1 on first use, other characters are added
+    # when they are first seen
+    for i in range(256):
+        char = chr(i)
+        _DISPATCH[char] = frozenset(
+            name for name, pat in FIRST_CHARS.items() if pat.match(char)
+        )
+
+
+def _candidate_types(char):
+    """Types that are possible for a cell that starts with char
+
+    >>> sorted(_candidate_types("a"))
+    ['unicode_alphanum', 'url_or_email']
+    >>> sorted(_candidate_types("1"))
+    ['date', 'number', 'time', 'unicode_alphanum', 'url_or_email']
+    >>> sorted(_candidate_types("$"))
+    ['currency', 'url_or_email']
+    """
+    try:
+        return _DISPATCH[char]
+    except KeyError:
+        if not _DISPATCH:
+            _fill_dispatch()
+            return _candidate_types(char)
+        types = frozenset(
+            name for name, pat in FIRST_CHARS.items() if pat.match(char)
+        )
+        _DISPATCH[char] = types
+        return types
+
+
+def _detect_types(cell):
+    """ Generate the types of a cell in order of precedence """
+    stripped = cell.strip()
+    s = stripped if STRIP_WHITESPACE else cell
+
+    if s == "":
+        # this can't be any of the other types
+        yield "empty"
+        return
+
+    types = _candidate_types(s[0])
+    if (
+        "url_or_email" in types
+        and (":" in s or "@" in s or s.startswith("www"))
+        and COMBINED["url_or_email"].fullmatch(s)
+    ):
+        yield "url_or_email"
+    is_number = "number" in types and cell != "" and scan_number(s)
+    if is_number:
+        yield "number"
+    if "time" in types and ":" in s and COMBINED["time"].fullmatch(s):
+        yield "time"
+    if stripped.endswith("%") and _is_number(stripped.rstrip("%")):
+        yield "percentage"
+    if "currency" in types:
+        m = PATTERNS["currency"].fullmatch(s)
+        if m and _is_number(m.group(1)):
+            yield "currency"
+    if "unicode_alphanum" in types and PATTERNS["unicode_alphanum"].fullmatch(
+        s
+    ):
+        yield "unicode_alphanum"
+    if s.lower() == "n/a":
+        yield "nan"
+    if "date" in types and not is_number and COMBINED["date"].fullmatch(s):
+        yield "date"
+    if (" " in cell or "T" in cell) and _test_datetime(
+        cell, _is_date, _is_time
+    ):
+        yield "datetime"
+
+
+def eval_types(cell, break_away=True):
+    """
+    Evaluate the type of a cell.
+
+    The cell is stripped once, the patterns of a type are tested together,
+    and only the tests that are possible for the first character of the cell
+    are run.
+
+    >>> cells = ["", "1,5", "12:30", "5%", "$5", "abc", "n/a", "31.07.2018"]
+    >>> [eval_types(c) for c in cells] # doctest: +NORMALIZE_WHITESPACE
+    ['empty', 'number', 'time', 'percentage', 'currency',
+     'unicode_alphanum', 'nan', 'date']
+    >>> eval_types("x#y") is None
+    True
+    """
+    detected = []
+    for name in _detect_types(cell):
+        detected.append(name)
+        if break_away:
+            break
+
+    return _check_detected(cell, detected)
+
+
+# Integer codes of the types for eval_types_batch(), in order of precedence.
+# Code 0 is used for cells without a type.
+
+TYPE_NAMES = [
+    None,
+    "empty",
+    "url_or_email",
+    "number",
+    "time",
+    "percentage",
+    "currency",
+    "unicode_alphanum",
+    "nan",
+    "date",
+    "datetime",
+]
+
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+
+def eval_types_batch(cells, eval_func=eval_types):
+    """
+    Evaluate the types of a list of cells as an array of integer type codes.
+
+    Every distinct cell is evaluated once. Empty cells and plain integers are
+    recognized with vectorized string operations, and the other cells are
+    evaluated with ``eval_func``, which gives the same result as eval_types().
+
+    >>> codes = eval_types_batch(["1", " ", "abc", "1", "2018-01-01", "x#y"])
+    >>> [TYPE_NAMES[c] for c in codes]
+    ['number', 'empty', 'unicode_alphanum', 'number', 'date', None]
+    """
+    # numpy and pandas are slow to import, and only needed here
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(np.asarray(cells, dtype=object))
+    values = pd.Series(uniques, dtype=object)
+    stripped = values.str.strip() if STRIP_WHITESPACE else values
+
+    types = np.zeros(len(values), dtype=np.int8)
+    empty = (stripped == "").to_numpy(dtype=bool)
+    # these can't be urls or emails, and are numbers by number_1
+    integer = stripped.str.fullmatch("0|[1-9][0-9]*").to_numpy(dtype=bool)
+    types[empty] = TYPE_CODES["empty"]
+    types[integer] = TYPE_CODES["number"]
+    for i in np.flatnonzero(~(empty | integer)):
+        types[i] = TYPE_CODES[eval_func(values[i])]
+    return types[codes]
+
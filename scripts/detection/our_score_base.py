@@ -11,63 +11,83 @@ Copyright (c) 2018 - The Alan Turing Institute
 License: See the LICENSE file.
 """
 
+import io
+import functools
 import itertools
 import re
 
+import numpy as np
+
 from collections import Counter
 
 from common.dialect import Dialect
-from common.encoding import get_encoding
 from common.escape import is_potential_escapechar
-from common.load import load_file
-from common.parser import parse_file
+from common.load import load_file_with_encoding
+from common.parser import CHUNK_SIZE, parse_spans
+from common.structural import StructuralIndex, structural_chars
 from common.detector_result import DetectorResult, Status, StatusMsg
-from common.utils import pairwise
-
-from .lib.types.rudi_types import eval_types
 
 from .core import can_be_delim_unicode, get_potential_quotechars
 from ._ties import break_ties
+from ._types import (
+    clear_cell_types,
+    format_type_cache_stats,
+    get_cell_type,
+    type_cache_stats,
+)
 
 BLOCKED_DELIMS = [".", "/", '"', "'"]
 
+# Engine used to compute the row patterns, "numpy", "python", or "stream"
+PATTERN_ENGINE = "numpy"
 
-def masked_by_quotechar(S, quotechar, escapechar, test_char):
-    """Test if a character is always masked by quote characters
 
-    >>> masked_by_quotechar('A"B&C"A', '"', '', '&')
-    True
-    >>> masked_by_quotechar('A"B&C"A&A', '"', '', '&')
-    False
-    >>> masked_by_quotechar('A|"B&C"A', '"', '|', '&')
-    False
-    >>> masked_by_quotechar('A"B"C', '"', '', '')
-    False
+def unmasked_chars(S, quotechar, escapechar):
+    """Get the characters that occur outside quotes at least once
+
+    A character that isn't in the result is always masked by quote
+    characters, so it can't be a delimiter of the dialect. Only the positions
+    of the quote and escape characters are visited, the text in between is
+    added in bulk.
+
+    >>> sorted(unmasked_chars('A"B&C"A', '"', ''))
+    ['A']
+    >>> sorted(unmasked_chars('A"B&C"A&A', '"', ''))
+    ['&', 'A']
+    >>> sorted(unmasked_chars('A|"B&C"A', '"', '|'))
+    ['&', 'A', 'B', 'C', '|']
     """
-    if test_char == "":
-        return False
-    escape_next = False
+    specials = set([quotechar, escapechar]) - set([""])
+    if not specials:
+        return set(S)
+    pattern = re.compile("|".join(map(re.escape, specials)))
+
+    chars = set()
     in_quotes = False
     i = 0
-    while i < len(S):
-        s = S[i]
-        if s == quotechar:
-            if escape_next:
-                i += 1
-                continue
+    m = pattern.search(S)
+    while m:
+        j = m.start()
+        if S[j] == quotechar:
             if not in_quotes:
+                chars.update(S[i:j])
                 in_quotes = True
+            elif S[j + 1 : j + 2] == quotechar:
+                j += 1
             else:
-                if i + 1 < len(S) and S[i + 1] == quotechar:
-                    i += 1
-                else:
-                    in_quotes = False
-        elif s == test_char and not in_quotes:
-            return False
-        elif s == escapechar:
-            escape_next = True
-        i += 1
-    return True
+                in_quotes = False
+            i = j + 1
+        else:
+            # After the first escape character all quote characters are
+            # skipped, so the quote state no longer changes.
+            if not in_quotes:
+                chars.update(S[i:])
+                chars.discard(quotechar)
+            return chars
+        m = pattern.search(S, i)
+    if not in_quotes:
+        chars.update(S[i:])
+    return chars
 
 
 def get_potential_delimiters(data, encoding):
@@ -83,125 +103,113 @@ def get_potential_delimiters(data, encoding):
     return delims
 
 
-def get_cells(data, dialect):
-    rows = parse_file(data, dialect=dialect)
-    all_cells = []
-    for row in rows:
-        all_cells.extend(row)
-    return all_cells
-
-
-def make_base_abstraction(S, dialect):
-    stack = ""
-    escape_next = False
-    for s in S:
-        if s in ["\r", "\n"]:
-            if not stack.endswith("R"):
-                stack += "R"
-        elif s == dialect.delimiter:
-            if escape_next:
-                stack += "C"
-                escape_next = False
-            else:
-                stack += "D"
-        elif s == dialect.quotechar:
-            if escape_next:
-                stack += "C"
-                escape_next = False
-            else:
-                stack += "Q"
-        elif s == dialect.escapechar:
-            if escape_next:
-                if not stack.endswith("C"):
-                    stack += "C"
-                escape_next = False
-            else:
-                escape_next = True
-        else:
-            if escape_next:
-                escape_next = False
-            if not stack.endswith("C"):
-                stack += "C"
-
-    return stack
+def delimiter_upper_bounds(data, delimiters, eps):
+    """
+    Upper bounds on the pattern score for every delimiter.
 
+    A row of the abstraction is made of one or more lines, and quotes and
+    escape characters can only hide delimiters. The pattern score of any
+    dialect with the delimiter is therefore at most the sum over the lines of
+    max(eps, n / (n + 1)), with n the number of delimiters on the line. The
+    characters of each line are counted once for all delimiters.
 
-def merge_with_quotechar(S, dialect):
-    in_quotes = False
-    i = 0
-    quote_pairs = []
-    while i < len(S):
-        s = S[i]
-        if not s == "Q":
-            i += 1
-            continue
+    >>> b = delimiter_upper_bounds('a,b;c\\na,b,c', [',', ';', ''], 0.001)
+    >>> sorted((d, round(x, 4)) for d, x in b.items())
+    [('', 0.002), (',', 1.1667), (';', 0.501)]
+    """
+    delimiters = set(delimiters)
+    lines = re.split("[\r\n]", data)
+    bounds = dict.fromkeys(delimiters, eps * len(lines))
+    for line in lines:
+        counts = Counter(line)
+        for delim in delimiters.intersection(counts):
+            n = counts[delim]
+            bounds[delim] += max(eps, n / (n + 1)) - eps
+    return bounds
+
+
+def prefilter_dialects(data, dialects, get_score, eps):
+    """
+    Remove the dialects that can't reach the score of a likely dialect.
 
-        if not in_quotes:
-            in_quotes = True
-            begin_quotes = i
-        else:
-            if i + 1 < len(S) and S[i + 1] == "Q":
-                i += 1
-            else:
-                end_quotes = i
-                quote_pairs.append((begin_quotes, end_quotes))
-                in_quotes = False
-        i += 1
+    The likely dialect is one with the delimiter that has the highest upper
+    bound, and ``get_score`` gives its score. Since the type score is at most
+    1, the upper bound of the pattern score also bounds the final score. The
+    remaining dialects are returned in sorted order.
+    """
+    dialects = sorted(dialects)
+    bounds = delimiter_upper_bounds(
+        data, set(d.delimiter for d in dialects), eps
+    )
+    likely = max(dialects, key=lambda d: bounds[d.delimiter])
+    lower_bound = get_score(likely)
+    # a little slack for the difference in rounding between the two sums
+    lower_bound -= 1e-9 * abs(lower_bound)
+    return [d for d in dialects if bounds[d.delimiter] >= lower_bound]
 
-    # replace quoted blocks by C
-    Sl = list(S)
-    for begin, end in quote_pairs:
-        for i in range(begin, end + 1):
-            Sl[i] = "C"
-    S = "".join(Sl)
 
-    return S
+def get_cells(data, dialect, index=None):
+    # The cells are returned as spans in the data and are only turned into 
+    # strings when iterated over.
+    return parse_spans(data, dialect=dialect, index=index)
 
 
-def strip_trailing(abstract):
-    while abstract.endswith("R"):
-        abstract = abstract[:-1]
-    return abstract
+URL_REGEX = re.compile(
+    r"(?:(?:[A-Za-z]{3,9}:(?:\/\/)?)(?:[-;:&=\+\$,\w]+@)?[A-Za-z0-9.-]+|(?:www.|[-;:&=\+\$,\w]+@)[A-Za-z0-9.-]+)(?:(?:\/[\+~%\/.\w\-_]*)?\??(?:[-\+=&;%@.\w_]*)#?(?:[\w]*))?"
+)
 
+# Longest text after the last newline that filter_urls_chunks() holds back
+MAX_URL_LENGTH = 2048
 
-def fill_empties(abstract):
-    while "DD" in abstract:
-        abstract = abstract.replace("DD", "DCD")
 
-    while "DR" in abstract:
-        abstract = abstract.replace("DR", "DCR")
+def _mask_url(match):
+    return "U" * (match.end() - match.start())
 
-    while "RD" in abstract:
-        abstract = abstract.replace("RD", "RCD")
 
-    while "CC" in abstract:
-        abstract = abstract.replace("CC", "C")
+def filter_urls(data):
+    """Replace every URL in the data by as many "U" characters
 
-    if abstract.startswith("D"):
-        abstract = "C" + abstract
+    >>> filter_urls('a,http://example.com/x?y=1,b')
+    'a,UUUUUUUUUUUUUUUUUUUUUUUU,b'
+    """
+    return URL_REGEX.sub(_mask_url, data)
 
-    if abstract.endswith("D"):
-        abstract += "C"
 
-    return abstract
+def filter_urls_chunks(chunks):
+    """Apply filter_urls() to a stream of chunks of text
 
+    A URL never contains a newline, so the text after the last newline of a
+    chunk is held back until the next chunk. If this is more than
+    MAX_URL_LENGTH characters, only the text after the last space in the
+    final MAX_URL_LENGTH characters is held back, or all of them if there is
+    no space. The output is the same as that of filter_urls() on the joined
+    chunks, unless a URL crosses such a cut in a very long line.
 
-def filter_urls(data):
-    pat = "(?:(?:[A-Za-z]{3,9}:(?:\/\/)?)(?:[-;:&=\+\$,\w]+@)?[A-Za-z0-9.-]+|(?:www.|[-;:&=\+\$,\w]+@)[A-Za-z0-9.-]+)(?:(?:\/[\+~%\/.\w\-_]*)?\??(?:[-\+=&;%@.\w_]*)#?(?:[\w]*))?"
-    url_idxs = []
-    for match in re.finditer(pat, data):
-        url_idxs.append(match.span())
-    Sl = list(data)
-    for begin, end in url_idxs:
-        for i in range(begin, end):
-            Sl[i] = "U"
-    return "".join(Sl)
-
-
-def make_abstraction(data, dialect):
+    >>> ''.join(filter_urls_chunks(['a,http://exa', 'mple.com\\nb,c']))
+    'a,UUUUUUUUUUUUUUUUUU\\nb,c'
+    """
+    tail = ""
+    for chunk in chunks:
+        text = tail + chunk
+        cut = text.rfind("\n") + 1
+        if len(text) - cut > MAX_URL_LENGTH:
+            start = len(text) - MAX_URL_LENGTH
+            cut = max(text.rfind(" ", start), start - 1) + 1
+        tail = text[cut:]
+        if cut:
+            yield filter_urls(text[:cut])
+    if tail:
+        yield filter_urls(tail)
+
+
+def make_abstraction(data, dialect, index=None):
     """
     Make the abstract representation of a CSV file.
 
+    Only the structural characters of the dialect are visited, a run of other 
+    characters always gives a single cell. Their positions are taken from the 
+    StructuralIndex ``index`` if it is given.
+
     Tests
     -----
 
@@ -242,13 +250,450 @@ def make_abstraction(data, dialect):
     'CDCDC'
 
     """
+    delimiter = dialect.delimiter
+    quotechar = dialect.quotechar
+    escapechar = dialect.escapechar
+
+    # The abstraction is built in three stages that each consume a token at a 
+    # time: the base abstraction of a character (C, D, Q, or R), merging of 
+    # quoted blocks into a single cell, and filling of empty cells.
+    out = []
+    # tokens of the current quoted block, including the opening quote
+    block = []
+    in_quotes = False
+    quote_pending = False
+    escape_next = False
+    last_base = ""
+
+    def emit(token):
+        # add a token to the output while filling empty cells
+        last = out[-1] if out else ""
+        if token == "C":
+            if last != "C":
+                out.append(token)
+            return
+        if token == "D" or token == "R":
+            if last == "D" or (last == "R" and token == "D"):
+                out.append("C")
+            elif last == "" and token == "D":
+                out.append("C")
+        out.append(token)
+
+    def merge(token):
+        # collapse quoted blocks into a single cell
+        nonlocal in_quotes, quote_pending
+        if quote_pending:
+            quote_pending = False
+            if token == "Q":
+                block.append(token)
+                return
+            in_quotes = False
+            del block[:]
+            emit("C")
+        if not in_quotes:
+            if token == "Q":
+                in_quotes = True
+                block.append(token)
+            else:
+                emit(token)
+            return
+        block.append(token)
+        if token == "Q":
+            quote_pending = True
+
+    specials = structural_chars(delimiter, quotechar, escapechar)
+    if index is None:
+        structural = re.compile("|".join(map(re.escape, specials)))
+        positions = (m.start() for m in structural.finditer(data))
+    else:
+        positions = index.iter_positions(specials)
+
+    prev = 0
+    for i in itertools.chain(positions, [len(data)]):
+        if i > prev:
+            # a run of characters that are not structural
+            escape_next = False
+            if last_base != "C":
+                last_base = "C"
+                merge("C")
+        prev = i + 1
+        if i == len(data):
+            break
+
+        s = data[i]
+        if s in ["\r", "\n"]:
+            token = "R"
+            if last_base == "R":
+                continue
+        elif s == delimiter:
+            if escape_next:
+                token = "C"
+                escape_next = False
+            else:
+                token = "D"
+        elif s == quotechar:
+            if escape_next:
+                token = "C"
+                escape_next = False
+            else:
+                token = "Q"
+        else:
+            # escapechar
+            if escape_next:
+                escape_next = False
+                if last_base == "C":
+                    continue
+                token = "C"
+            else:
+                escape_next = True
+                continue
+        last_base = token
+        merge(token)
+
+    if quote_pending:
+        emit("C")
+    elif in_quotes:
+        for token in block:
+            emit(token)
 
-    A = make_base_abstraction(data, dialect)
-    A = merge_with_quotechar(A, dialect)
-    A = fill_empties(A)
-    A = strip_trailing(A)
+    if out and out[-1] == "D":
+        out.append("C")
+    while out and out[-1] == "R":
+        out.pop()
 
-    return A
+    return "".join(out)
+
+
+def get_row_patterns(data, dialect, index=None, engine=None):
+    """
+    Count the row patterns of the abstraction of a CSV file.
+
+    This gives the same Counter as ``Counter(make_abstraction(data, 
+    dialect).split("R"))``, including the order of the patterns. The default 
+    engine (see PATTERN_ENGINE) computes the abstraction with numpy on the 
+    positions of the structural characters and counts the rows by their 
+    number of delimiters. Python loops only visit the quote characters, the 
+    escape characters, and the quoted rows. Only the distinct patterns are turned into 
+    strings, so the pattern score is computed on a few strings per dialect, 
+    whatever the size of the file. The "python" engine uses 
+    make_abstraction(), and the "stream" engine uses the 
+    RowPatternAccumulator, which only keeps one row in memory.
+
+    >>> get_row_patterns('a,b\\n\\nc,"d,e"\\n"f,g', Dialect(',', '"', ''))
+    Counter({'CDC': 2, 'QCDC': 1})
+    >>> get_row_patterns('a|,b\\n\\nc,d', Dialect(',', '', '|'))
+    Counter({'C': 1, 'CDC': 1})
+    >>> get_row_patterns('\\n', Dialect(',', '', ''))
+    Counter({'': 1})
+    """
+    engine = PATTERN_ENGINE if engine is None else engine
+    if engine == "stream":
+        return stream_row_patterns(io.StringIO(data), dialect)
+    if engine == "numpy":
+        if index is None:
+            index = StructuralIndex(data, structural_chars(
+                dialect.delimiter, dialect.quotechar, dialect.escapechar
+            ))
+        return _row_patterns_numpy(data, dialect, index)
+    elif engine != "python":
+        raise ValueError("Unknown pattern engine: %s" % engine)
+    A = make_abstraction(data, dialect, index=index)
+    return Counter(A.split("R"))
+
+
+def _row_patterns_numpy(data, dialect, index):
+    # Token codes are the ASCII values of the abstraction characters, and E 
+    # is used for the escape character
+    C, D, E, Q, R = map(ord, "CDEQR")
+
+    # Structural tokens in order of position. The precedence for characters 
+    # that play multiple roles is the same as in make_abstraction.
+    positions = []
+    kinds = []
+    specials = structural_chars(
+        dialect.delimiter, dialect.quotechar, dialect.escapechar
+    )
+    for c in specials:
+        pos = index.positions(c)
+        if c in ["\r", "\n"]:
+            kind = R
+        elif c == dialect.delimiter:
+            kind = D
+        elif c == dialect.quotechar:
+            kind = Q
+        else:
+            kind = E
+        positions.append(np.frombuffer(pos, dtype="i%i" % pos.itemsize))
+        kinds.append(np.full(len(pos), kind, dtype=np.uint8))
+    pos = np.concatenate(positions).astype(np.int64)
+    order = np.argsort(pos, kind="stable")
+    pos = pos[order]
+    kind = np.concatenate(kinds)[order]
+
+    # Base abstraction: a run of other characters before a structural token 
+    # (or at the end) gives a cell, and repeated row separators are dropped.
+    prev_end = np.concatenate(([0], pos[:-1] + 1))
+    gap = pos > prev_end
+    if E in kind:
+        _resolve_escapes(kind, gap, C, E, R)
+    end_gap = len(data) > (pos[-1] + 1 if len(pos) else 0)
+    n_gap = np.cumsum(gap)
+    tokens = np.empty(len(pos) + n_gap[-1:].sum() + end_gap, dtype=np.uint8)
+    tokens[np.arange(len(pos)) + n_gap] = kind
+    tokens[(np.arange(len(pos)) + n_gap - 1)[gap]] = C
+    if end_gap:
+        tokens[-1] = C
+    tokens = tokens[tokens != E]
+    prev = np.concatenate(([0], tokens[:-1]))
+    tokens = tokens[~((tokens == R) & (prev == R))]
+
+    # Merge quoted blocks. The pairing of quotes is sequential, so we loop 
+    # over the quote tokens only.
+    quotes = np.flatnonzero(tokens == Q).tolist()
+    delta = np.zeros(len(tokens) + 1, dtype=np.int64)
+    in_quotes = False
+    j = 0
+    while j < len(quotes):
+        if not in_quotes:
+            in_quotes = True
+            begin = quotes[j]
+        elif j + 1 < len(quotes) and quotes[j + 1] == quotes[j] + 1:
+            j += 1
+        else:
+            delta[begin] += 1
+            delta[quotes[j] + 1] -= 1
+            in_quotes = False
+        j += 1
+    tokens[np.cumsum(delta)[:-1] > 0] = C
+
+    # Fill empty cells and strip trailing row separators
+    prev = np.concatenate(([0], tokens[:-1]))
+    tokens = tokens[~((tokens == C) & (prev == C))]
+    prev = np.concatenate(([0], tokens[:-1]))
+    is_sep = (tokens == D) | (tokens == R)
+    empty = ((prev == D) & is_sep) | ((prev == R) & (tokens == D))
+    empty |= (prev == 0) & (tokens == D)
+    tokens = np.insert(tokens, np.flatnonzero(empty), C)
+    if len(tokens) and tokens[-1] == D:
+        tokens = np.append(tokens, np.uint8(C))
+    n_strip = 0
+    while n_strip < len(tokens) and tokens[len(tokens) - n_strip - 1] == R:
+        n_strip += 1
+    tokens = tokens[: len(tokens) - n_strip]
+
+    # Rows without quotes have the pattern C(DC)* and are identified by the 
+    # number of delimiters (or -1 if the row is empty). Rows with quotes are 
+    # identified by their pattern.
+    seps = np.flatnonzero(tokens == R)
+    starts = np.concatenate(([0], seps + 1))
+    ends = np.concatenate((seps, [len(tokens)]))
+    n_delim = np.concatenate(([0], np.cumsum(tokens == D)))
+    n_quote = np.concatenate(([0], np.cumsum(tokens == Q)))
+    row_delims = n_delim[ends] - n_delim[starts]
+    row_quoted = (n_quote[ends] - n_quote[starts]) > 0
+    keys = np.where(ends > starts, row_delims, -1)
+
+    first = {}
+    unquoted = np.flatnonzero(~row_quoted)
+    values, idx, counts = np.unique(
+        keys[unquoted], return_index=True, return_counts=True
+    )
+    for k, i, n in zip(values.tolist(), idx.tolist(), counts.tolist()):
+        pattern = "" if k < 0 else "C" + "DC" * k
+        first[pattern] = (unquoted[i], n)
+    # the quoted rows are counted by slices of the bytes of the tokens
+    quoted = np.flatnonzero(row_quoted)
+    blob = tokens.tobytes()
+    first_quoted = {}
+    for i, a, b in zip(
+        quoted.tolist(), starts[quoted].tolist(), ends[quoted].tolist()
+    ):
+        r, n = first_quoted.get(blob[a:b], (i, 0))
+        first_quoted[blob[a:b]] = (r, n + 1)
+    for key, (r, n) in first_quoted.items():
+        # these contain a Q, so they differ from the patterns above
+        first[key.decode("ascii")] = (r, n)
+
+    row_patterns = Counter()
+    for pattern in sorted(first, key=lambda p: first[p][0]):
+        row_patterns[pattern] = first[pattern][1]
+    return row_patterns
+
+
+def _resolve_escapes(kind, gap, C, E, R):
+    """
+    Apply the escape characters to the structural tokens of a dialect.
+
+    An escape character escapes the next delimiter, quote character, or 
+    escape character, which then becomes part of a cell. Row separators in 
+    between are kept, and a run of other characters in between (``gap``) 
+    cancels the escape. The escaping escape characters are left as E in 
+    ``kind``, to be removed by the caller. Only the escape characters are 
+    visited.
+    """
+    n = len(kind)
+    escaped = -1
+    for j in np.flatnonzero(kind == E).tolist():
+        if j <= escaped:
+            continue
+        k = j + 1
+        while k < n and not gap[k] and kind[k] == R:
+            k += 1
+        if k < n and not gap[k]:
+            kind[k] = C
+            escaped = k
+
+
+class _RowEmitter(object):
+    """ Fill empty cells in a stream of tokens and count the row patterns """
+
+    def __init__(self, row=None, last=""):
+        self.counts = Counter()
+        self.row = [] if row is None else row
+        self.last = last
+
+    def fork(self):
+        return _RowEmitter(row=list(self.row), last=self.last)
+
+    def emit(self, token):
+        last = self.last
+        if token == "C":
+            if last != "C":
+                self.row.append(token)
+                self.last = token
+            return
+        if token == "D" or token == "R":
+            if last == "D" or (last == "R" and token == "D"):
+                self.row.append("C")
+            elif last == "" and token == "D":
+                self.row.append("C")
+        if token == "R":
+            self.counts["".join(self.row)] += 1
+            self.row = []
+        else:
+            self.row.append(token)
+        self.last = token
+
+    def finish(self):
+        if self.last == "D":
+            self.row.append("C")
+        # trailing row separators are stripped from the abstraction
+        if self.last != "R":
+            self.counts["".join(self.row)] += 1
+        return self.counts
+
+
+class RowPatternAccumulator(object):
+    """
+    Streaming computation of the row patterns of the abstraction.
+
+    The data is fed in chunks and the counts of the row patterns are updated 
+    as soon as a row is complete, so that only the pattern of the current row 
+    is kept in memory. The result of ``close()`` is the same Counter as 
+    ``Counter(make_abstraction(data, dialect).split("R"))``.
+
+    Whether a quoted block is closed is only known when the closing quote is 
+    found, and an unclosed block is kept as is. While inside quotes we 
+    therefore count the rows for the case where the block turns out to be 
+    unclosed separately, and discard these counts when the quote is closed.
+
+    >>> acc = RowPatternAccumulator(Dialect(',', '"', ''))
+    >>> for chunk in ['a,"b', '\\nc",d\\n', 'e,f\\n']:
+    ...     acc.feed(chunk)
+    >>> acc.close()
+    Counter({'CDCDC': 1, 'CDC': 1})
+    """
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+        specials = structural_chars(
+            dialect.delimiter, dialect.quotechar, dialect.escapechar
+        )
+        self._structural = re.compile("|".join(map(re.escape, specials)))
+        self._main = _RowEmitter()
+        # counts for the case that the current quoted block is not closed
+        self._unclosed = None
+        self._quote_pending = False
+        self._escape_next = False
+        self._last_base = ""
+
+    def _merge(self, token):
+        if self._quote_pending:
+            self._quote_pending = False
+            if token == "Q":
+                self._unclosed.emit(token)
+                return
+            self._unclosed = None
+            self._main.emit("C")
+        if self._unclosed is None:
+            if token == "Q":
+                self._unclosed = self._main.fork()
+                self._unclosed.emit(token)
+            else:
+                self._main.emit(token)
+            return
+        self._unclosed.emit(token)
+        if token == "Q":
+            self._quote_pending = True
+
+    def feed(self, chunk):
+        delimiter = self.dialect.delimiter
+        quotechar = self.dialect.quotechar
+        prev = 0
+        for m in itertools.chain(self._structural.finditer(chunk), [None]):
+            i = len(chunk) if m is None else m.start()
+            if i > prev:
+                # a run of characters that are not structural
+                self._escape_next = False
+                if self._last_base != "C":
+                    self._last_base = "C"
+                    self._merge("C")
+            prev = i + 1
+            if m is None:
+                break
+
+            s = chunk[i]
+            if s in ["\r", "\n"]:
+                token = "R"
+                if self._last_base == "R":
+                    continue
+            elif s == delimiter:
+                token = "C" if self._escape_next else "D"
+                self._escape_next = False
+            elif s == quotechar:
+                token = "C" if self._escape_next else "Q"
+                self._escape_next = False
+            else:
+                # escapechar
+                if not self._escape_next:
+                    self._escape_next = True
+                    continue
+                self._escape_next = False
+                if self._last_base == "C":
+                    continue
+                token = "C"
+            self._last_base = token
+            self._merge(token)
+
+    def close(self):
+        if self._quote_pending:
+            self._main.emit("C")
+        elif not self._unclosed is None:
+            self._main.counts.update(self._unclosed.counts)
+            self._main.row = self._unclosed.row
+            self._main.last = self._unclosed.last
+        return self._main.finish()
+
+
+def stream_row_patterns(stream, dialect, chunksize=CHUNK_SIZE):
+    """ Count the row patterns of a CSV file given as a text stream """
+    acc = RowPatternAccumulator(dialect)
+    while True:
+        chunk = stream.read(chunksize)
+        if not chunk:
+            break
+        acc.feed(chunk)
+    return acc.close()
 
 
 def count_cd_in_pat(pattern):
@@ -260,7 +705,27 @@ def count_cd_in_pat(pattern):
 
 
 def is_clean(cell):
-    return not (eval_types(cell) is None)
+    return not (get_cell_type(cell) is None)
+
+
+def get_escape_followers(data, encoding):
+    """Map every potential escape character to the characters that follow it
+
+    This is done in a single pass over the distinct pairs of consecutive
+    characters, so is_potential_escapechar() is only called once per
+    character.
+
+    >>> get_escape_followers('a/,b/"c/,', 'utf-8') == {'/': {',', '"'}}
+    True
+    """
+    followers = {}
+    potential = {}
+    for u, v in set(zip(data, data[1:])):
+        if not u in potential:
+            potential[u] = is_potential_escapechar(u, encoding)
+        if potential[u]:
+            followers.setdefault(u, set()).add(v)
+    return followers
 
 
 def get_potential_dialects(data, encoding):
@@ -278,32 +743,51 @@ def get_potential_dialects(data, encoding):
     """
     delims = get_potential_delimiters(data, encoding)
     quotechars = get_potential_quotechars(data)
-    escapechars = {}
+    followers = get_escape_followers(data, encoding)
 
+    escapechars = {}
     for delim, quotechar in itertools.product(delims, quotechars):
         escapechars[(delim, quotechar)] = set([""])
-
-    for u, v in pairwise(data):
-        if not is_potential_escapechar(u, encoding):
-            continue
-        for delim, quotechar in itertools.product(delims, quotechars):
-            if v == delim or v == quotechar:
+        for u, after in followers.items():
+            if delim in after or quotechar in after:
                 escapechars[(delim, quotechar)].add(u)
 
+    # A delimiter is masked by the quote character if it never occurs
+    # outside quotes, the characters outside quotes are found once per
+    # quote and escape character.
+    unmasked = {}
     dialects = []
     for delim in delims:
         for quotechar in quotechars:
             for escapechar in escapechars[(delim, quotechar)]:
-                if masked_by_quotechar(data, quotechar, escapechar, delim):
+                key = (quotechar, escapechar)
+                if not key in unmasked:
+                    unmasked[key] = unmasked_chars(data, quotechar, escapechar)
+                if delim and not delim in unmasked[key]:
                     continue
                 d = Dialect(delim, quotechar, escapechar)
                 dialects.append(d)
     return dialects
 
 
-def determine_dqr(filename, score_func, verbose=False, do_break_ties=True):
-    encoding = get_encoding(filename)
-    data = load_file(filename, encoding=encoding)
+def determine_dqr(
+    filename,
+    score_func,
+    verbose=False,
+    do_break_ties=True,
+    pool=None,
+    sample_size=None,
+):
+    """
+    Detect the dialect of a file with the given score function.
+
+    With a pool (see _parallel.DialectPool) the candidate dialects are scored
+    by its processes, if the score function supports it. With a sample_size
+    the type scores are estimated from samples of the cells, which the score
+    function must then support, and the sample sizes are reported on the
+    result.
+    """
+    encoding, data = load_file_with_encoding(filename)
     if data is None:
         return DetectorResult(
             status=Status.SKIP, status_msg=StatusMsg.UNREADABLE
@@ -323,7 +807,37 @@ def determine_dqr(filename, score_func, verbose=False, do_break_ties=True):
             "Considering %i dialects\n" % (len(data), len(dialects))
         )
 
-    scores = score_func(data, dialects, verbose=verbose)
+    # The positions of the potential structural characters are shared by all
+    # dialects.
+    index = StructuralIndex.from_dialects(data, dialects)
+
+    sample_sizes = {}
+    if sample_size:
+        score_func = functools.partial(
+            score_func, sample_size=sample_size, sample_sizes=sample_sizes
+        )
+    try:
+        scores = score_func(
+            data, dialects, verbose=verbose, index=index, pool=pool
+        )
+    finally:
+        clear_cell_types()
+    sample_sizes = [
+        {
+            "dialect": dialect.to_dict(),
+            "sample_size": size,
+            "n_cells": n_cells,
+            "exact": exact,
+        }
+        for dialect, (size, n_cells, exact) in sorted(sample_sizes.items())
+    ]
+
+    # dialects that are removed by the prefilter don't get a score
+    n_pruned = len(dialects) - len(scores)
+    if verbose:
+        print("Pruned %i of %i dialects" % (n_pruned, len(dialects)))
+        if not type_cache_stats() is None:
+            print(format_type_cache_stats())
 
     score_sort = sorted(
         [(scores[dialect], dialect) for dialect in scores],
@@ -348,9 +862,19 @@ def determine_dqr(filename, score_func, verbose=False, do_break_ties=True):
             for d in dialects_with_score:
                 print(d)
         return DetectorResult(
-            status=Status.FAIL, status_msg=StatusMsg.MULTIPLE_ANSWERS
+            status=Status.FAIL,
+            status_msg=StatusMsg.MULTIPLE_ANSWERS,
+            sample_sizes=sample_sizes or None,
+            n_dialects=len(dialects),
+            n_pruned=n_pruned,
         )
 
-    res = DetectorResult(dialect=res, status=Status.OK)
+    res = DetectorResult(
+        dialect=res,
+        status=Status.OK,
+        sample_sizes=sample_sizes or None,
+        n_dialects=len(dialects),
+        n_pruned=n_pruned,
+    )
 
     return res
@@ -10,10 +10,19 @@ Copyright (c) 2018 - The Alan Turing Institute
 License: See the LICENSE file.
 """
 
+import math
+import random
+
 from collections import Counter
 
 from .core import run
-from .our_score_base import determine_dqr, get_cells, is_clean, make_abstraction
+from .our_score_base import (
+    determine_dqr,
+    get_cells,
+    get_row_patterns,
+    is_clean,
+    prefilter_dialects,
+)
 
 DETECTOR = "our_score_full"
 
@@ -22,60 +31,301 @@ DETECTOR = "our_score_full"
 EPS_PAT = 1e-3
 EPS_TYP = 1e-10
 
+# The type scores that are estimated from a sample of the cells (see the
+# --type-sample option) have confidence intervals with z-value TYPE_SAMPLE_Z,
+# and the sample is drawn with TYPE_SAMPLE_SEED.
+TYPE_SAMPLE_Z = 2.576
+TYPE_SAMPLE_SEED = 42
 
-def get_scores(data, dialects, verbose=False):
-    scores = {}
-    max_score = -float("inf")
-    for dialect in sorted(dialects):
-        A = make_abstraction(data, dialect)
-        row_patterns = Counter(A.split("R"))
-        pattern_score = 0
-        for pat_p, n_p in row_patterns.items():
-            Lk = len(pat_p.split("D"))
-            pattern_score += n_p * (max(EPS_PAT, Lk - 1) / Lk)
-        pattern_score /= len(row_patterns)
-
-        if pattern_score == 0:
-            # if pattern score is zero, the outcome will be zero, so we
-            # don't have to check types.
-            type_score = float("nan")
-            score = 0
-        elif pattern_score < max_score:
-            # since the type score is in [0, 1], if the pattern score
-            # is smaller than the current best score, it can't possibly
-            # be improved by types, so we don't have to bother.
-            type_score = float("nan")
-            score = 0
-        else:
-            cells = get_cells(data, dialect)
-            n_clean = sum((is_clean(cell) for cell in cells))
-            n_cells = len(cells)
 
-            if n_cells == 0:
-                type_score = EPS_TYP
-            else:
-                type_score = max(EPS_TYP, n_clean / n_cells)
-            score = type_score * pattern_score
+def get_type_score(cells, pattern_score=1, max_score=-float("inf")):
+    """
+    Compute the type score of the cells of a file.
+
+    Every distinct cell value is only evaluated once. The computation stops as
+    soon as the values that are left can't lift the final score (the type
+    score times ``pattern_score``) to ``max_score``, in which case None is
+    returned.
+    """
+    counts = Counter(cells)
+    n_cells = sum(counts.values())
+    if n_cells == 0:
+        return EPS_TYP
+
+    n_clean = 0
+    n_left = n_cells
+    for cell, count in counts.items():
+        n_left -= count
+        if is_clean(cell):
+            n_clean += count
+            continue
+        upper = max(EPS_TYP, (n_clean + n_left) / n_cells)
+        if upper * pattern_score < max_score:
+            return None
+    return max(EPS_TYP, n_clean / n_cells)
+
+
+def get_pattern_score(data, dialect, index=None):
+    row_patterns = get_row_patterns(data, dialect, index=index)
+    pattern_score = 0
+    for pat_p, n_p in row_patterns.items():
+        Lk = len(pat_p.split("D"))
+        pattern_score += n_p * (max(EPS_PAT, Lk - 1) / Lk)
+    pattern_score /= len(row_patterns)
+    return pattern_score
+
+
+def get_dialect_type_score(
+    data, dialect, index=None, pattern_score=1, max_score=-float("inf")
+):
+    """
+    Compute the type score of a dialect, or None if it can't beat max_score.
+
+    Since the type score is in [0, 1], a dialect with a pattern score smaller
+    than the current best score can't possibly be improved by types. If the
+    pattern score is zero, the outcome will be zero.
+    """
+    if not (pattern_score > 0 and pattern_score >= max_score):
+        return None
+    cells = get_cells(data, dialect, index=index)
+    return get_type_score(cells, pattern_score, max_score)
+
+
+def get_scores(
+    data,
+    dialects,
+    verbose=False,
+    index=None,
+    pool=None,
+    sample_size=None,
+    sample_sizes=None,
+):
+    return compute_scores(
+        data,
+        dialects,
+        get_pattern_score,
+        verbose=verbose,
+        index=index,
+        pool=pool,
+        sample_size=sample_size,
+        sample_sizes=sample_sizes,
+    )
+
+
+def set_exact_type_scores(
+    data, dialects, pattern_scores, type_scores, index=None
+):
+    """
+    Compute the missing type scores of the dialects.
+
+    This is done in order of decreasing pattern score, so that as many
+    dialects as possible can be skipped. Skipped dialects get None.
+    """
+    known = [d for d in type_scores if not type_scores[d] is None]
+    max_score = max(
+        (pattern_scores[d] * type_scores[d] for d in known),
+        default=-float("inf"),
+    )
+    order = sorted(dialects, key=pattern_scores.get, reverse=True)
+    for dialect in order:
+        if dialect in type_scores:
+            continue
+        pattern_score = pattern_scores[dialect]
+        type_scores[dialect] = get_dialect_type_score(
+            data, dialect, index, pattern_score, max_score
+        )
+        if not type_scores[dialect] is None:
+            score = type_scores[dialect] * pattern_score
+            max_score = max(max_score, score)
+
+
+def wilson_interval(k, n, z=TYPE_SAMPLE_Z):
+    """Wilson score interval of a proportion k/n
+
+    >>> lo, hi = wilson_interval(90, 100)
+    >>> round(lo, 4), round(hi, 4)
+    (0.7962, 0.954)
+    """
+    p = k / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
 
-        scores[dialect] = score
-        max_score = max(max_score, score)
+
+def set_sampled_type_scores(
+    data,
+    dialects,
+    pattern_scores,
+    type_scores,
+    sample_size,
+    sample_sizes,
+    index=None,
+):
+    """
+    Estimate the missing type scores from a random sample of the cells.
+
+    Every dialect with more than sample_size cells gets an estimate and a
+    confidence interval of its type score from a sample of its cells. The
+    same positions are sampled for every dialect, so dialects with the same
+    cells get the same estimate. The dialects with a score interval that
+    overlaps with the interval of the leading dialect are then evaluated
+    exactly. Returns the confidence intervals of the type scores, which are a
+    single point for exact scores. The sample size, the number of cells, and
+    whether the score was computed exactly after all are stored in
+    sample_sizes for every dialect that was sampled.
+    """
+    intervals = {}
+    n_cells_of = {}
+    for dialect in dialects:
+        if dialect in type_scores:
+            if not type_scores[dialect] is None:
+                exact = type_scores[dialect]
+                intervals[dialect] = (exact, exact)
+            continue
+        if pattern_scores[dialect] == 0:
+            # the outcome will be zero
+            type_scores[dialect] = None
+            continue
+
+        cells = get_cells(data, dialect, index=index)
+        n_cells = len(cells)
+        if n_cells <= sample_size:
+            exact = get_type_score(cells)
+            type_scores[dialect] = exact
+            intervals[dialect] = (exact, exact)
+            continue
+
+        rng = random.Random(TYPE_SAMPLE_SEED)
+        sample = rng.sample(range(n_cells), sample_size)
+        n_clean = sum(is_clean(cells.cell(k)) for k in sample)
+        lo, hi = wilson_interval(n_clean, sample_size)
+        type_scores[dialect] = max(EPS_TYP, n_clean / sample_size)
+        intervals[dialect] = (max(EPS_TYP, lo), max(EPS_TYP, hi))
+        n_cells_of[dialect] = n_cells
+        sample_sizes[dialect] = (sample_size, n_cells, False)
+
+    if not intervals:
+        return intervals
+
+    lead = max(lo * pattern_scores[d] for d, (lo, _) in intervals.items())
+    overlap = [
+        d for d, (_, hi) in intervals.items() if hi * pattern_scores[d] >= lead
+    ]
+    if len(overlap) > 1:
+        for dialect in overlap:
+            if dialect in n_cells_of:
+                del type_scores[dialect]
+                del intervals[dialect]
+                n_cells = n_cells_of[dialect]
+                sample_sizes[dialect] = (sample_size, n_cells, True)
+        set_exact_type_scores(
+            data, overlap, pattern_scores, type_scores, index=index
+        )
+    return intervals
+
+
+def compute_scores(
+    data,
+    dialects,
+    get_pattern_score,
+    verbose=False,
+    index=None,
+    pool=None,
+    sample_size=None,
+    sample_sizes=None,
+):
+    """
+    Compute the scores of the dialects with the given pattern score function.
+
+    With a pool (see _parallel.DialectPool) the dialects are scored by its
+    processes, in which case get_pattern_score must be defined at module
+    level. With a sample_size the type scores are estimated from samples of
+    the cells where possible, and the sample sizes are stored in the
+    sample_sizes dict, see set_sampled_type_scores().
+    """
+    pattern_scores = {}
+    type_scores = {}
+
+    def get_score(dialect):
+        pattern_scores[dialect] = get_pattern_score(data, dialect, index)
+        cells = get_cells(data, dialect, index=index)
+        type_scores[dialect] = get_type_score(cells)
+        return pattern_scores[dialect] * type_scores[dialect]
+
+    # Dialects that can't beat a likely dialect are removed before the
+    # abstraction is made.
+    dialects = prefilter_dialects(data, dialects, get_score, EPS_PAT)
+    max_score = max(pattern_scores[d] * type_scores[d] for d in type_scores)
+
+    if not pool is None:
+        todo = [d for d in dialects if not d in pattern_scores]
+        p, t = pool.score(
+            data,
+            todo,
+            get_pattern_score,
+            None if sample_size else get_dialect_type_score,
+            max_score=max_score,
+        )
+        pattern_scores.update(p)
+        type_scores.update(t)
+    else:
+        # The pattern scores are cheap, so we compute them for all dialects
+        # first.
+        for dialect in dialects:
+            if not dialect in pattern_scores:
+                pattern_scores[dialect] = get_pattern_score(
+                    data, dialect, index
+                )
+
+    intervals = {}
+    if sample_size:
+        intervals = set_sampled_type_scores(
+            data,
+            dialects,
+            pattern_scores,
+            type_scores,
+            sample_size,
+            {} if sample_sizes is None else sample_sizes,
+            index=index,
+        )
+    elif pool is None:
+        set_exact_type_scores(
+            data, dialects, pattern_scores, type_scores, index=index
+        )
+
+    scores = {}
+    for dialect in dialects:
+        if type_scores[dialect] is None:
+            type_scores[dialect] = float("nan")
+            scores[dialect] = 0
+        else:
+            scores[dialect] = type_scores[dialect] * pattern_scores[dialect]
 
         if verbose:
+            lo, hi = intervals.get(dialect, (0, 0))
             print(
-                "%15r:\ttype = %.6f\tpattern = %.6f\tfinal = %s"
+                "%15r:\ttype = %.6f\tpattern = %.6f\tfinal = %s%s"
                 % (
                     dialect,
-                    type_score,
-                    pattern_score,
+                    type_scores[dialect],
+                    pattern_scores[dialect],
                     "0" if scores[dialect] == 0 else "%.6f" % scores[dialect],
+                    "\t(type in [%.6f, %.6f])" % (lo, hi) if lo < hi else "",
                 )
             )
 
     return scores
 
 
-def wrap_determine_dqr(filename, verbose=False):
-    return determine_dqr(filename, get_scores, verbose=verbose)
+def wrap_determine_dqr(filename, verbose=False, pool=None, sample_size=None):
+    return determine_dqr(
+        filename,
+        get_scores,
+        verbose=verbose,
+        pool=pool,
+        sample_size=sample_size,
+    )
 
 
 def main():
@@ -11,26 +11,32 @@ Copyright (c) 2018 - The Alan Turing Institute
 License: See the LICENSE file.
 """
 
-from collections import Counter
-
 from .core import run
-from .our_score_base import determine_dqr, make_abstraction
-from .our_score_full import EPS_PAT
+from .our_score_base import determine_dqr, prefilter_dialects
+from .our_score_full import EPS_PAT, get_pattern_score
 
 
 DETECTOR = "our_score_pattern_only"
 
 
-def get_scores(data, dialects, verbose=False):
+def get_scores(data, dialects, verbose=False, index=None, pool=None):
+    pattern_scores = {}
+
+    def get_score(dialect):
+        pattern_scores[dialect] = get_pattern_score(data, dialect, index)
+        return pattern_scores[dialect]
+
+    dialects = prefilter_dialects(data, dialects, get_score, EPS_PAT)
+    if not pool is None:
+        todo = [d for d in dialects if not d in pattern_scores]
+        p, _ = pool.score(data, todo, get_pattern_score)
+        pattern_scores.update(p)
+
     scores = {}
-    for dialect in sorted(dialects):
-        A = make_abstraction(data, dialect)
-        row_patterns = Counter(A.split("R"))
-        pattern_score = 0
-        for pat_p, n_p in row_patterns.items():
-            Lk = len(pat_p.split("D"))
-            pattern_score += n_p * (max(EPS_PAT, Lk - 1) / Lk)
-        pattern_score /= len(row_patterns)
+    for dialect in dialects:
+        if not dialect in pattern_scores:
+            pattern_scores[dialect] = get_pattern_score(data, dialect, index)
+        pattern_score = pattern_scores[dialect]
 
         score = pattern_score
         scores[dialect] = score
@@ -48,8 +54,8 @@ def get_scores(data, dialects, verbose=False):
     return scores
 
 
-def wrap_determine_dqr(filename, verbose=False):
-    return determine_dqr(filename, get_scores, verbose=verbose)
+def wrap_determine_dqr(filename, verbose=False, pool=None):
+    return determine_dqr(filename, get_scores, verbose=verbose, pool=pool)
 
 
 def main():
@@ -10,20 +10,28 @@ Copyright (c) 2018 - The Alan Turing Institute
 License: See the LICENSE file.
 """
 
+import numpy as np
+
+from common.parser import iter_spans
+
+from ._types import get_cell_type
 from .core import run
-from .our_score_base import determine_dqr, get_cells, is_clean
+from .lib.types.rudi_types import eval_types_batch
+from .our_score_base import determine_dqr
 from .our_score_full import EPS_TYP
 
 
 DETECTOR = "our_score_type_only"
 
 
-def get_scores(data, dialects, verbose=False):
+def get_scores(data, dialects, verbose=False, index=None, pool=None):
     scores = {}
-    for dialect in sorted(dialects):
-        cells = get_cells(data, dialect)
-        n_clean = sum((is_clean(cell) for cell in cells))
-        n_cells = len(cells)
+    # All dialects need their cells here, so we parse them in groups that
+    # share a pass over the data. There is no pruning, and the pool is not used.
+    for dialect, cells in iter_spans(data, sorted(dialects), index=index):
+        codes = eval_types_batch(list(cells), get_cell_type)
+        n_clean = np.count_nonzero(codes)
+        n_cells = len(codes)
 
         if n_cells == 0:
             type_score = EPS_TYP
@@ -20,8 +20,7 @@ from multiprocessing import Process, Manager
 
 from .core import run
 
-from common.encoding import get_encoding
-from common.load import load_file
+from common.load import load_file_with_encoding
 from common.detector_result import DetectorResult, Dialect, Status, StatusMsg
 
 DETECTOR = "sniffer"
@@ -88,8 +87,7 @@ def sniff(sample, delimiters=None):
 
 def determine_dqr(filename, verbose=False):
     """ Run the python CSV Sniffer """
-    encoding = get_encoding(filename)
-    data = load_file(filename, encoding=encoding)
+    encoding, data = load_file_with_encoding(filename)
     if data is None:
         return DetectorResult(
             status=Status.SKIP, status_msg=StatusMsg.UNREADABLE
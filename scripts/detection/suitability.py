@@ -11,29 +11,31 @@ License: See the LICENSE file.
 
 """
 
+import numpy as np
 
 from common.dialect import Dialect
-from common.encoding import get_encoding
 from common.escape import is_potential_escapechar
-from common.load import load_file
-from common.parser import parse_file
+from common.load import load_file_with_encoding
+from common.parser import iter_spans, parse_spans
 from common.detector_result import DetectorResult, Status, StatusMsg
 from common.utils import pairwise
 
 from .core import run, get_potential_quotechars
-from .lib.types.rudi_types import eval_types
+from .lib.types.rudi_types import TYPE_CODES, eval_types_batch
 from ._ties import break_ties
+from ._types import (
+    clear_cell_types,
+    format_type_cache_stats,
+    get_cell_type,
+    type_cache_stats,
+)
 
 DETECTOR = "suitability"
 WRANGLER_DELIMS = [",", ":", "|", "\t"]
 
 
 def extract_cells(data, dialect):
-    cells = []
-    rows = parse_file(data, dialect)
-    for row in rows:
-        cells.extend(row)
-    return cells
+    return parse_spans(data, dialect)
 
 
 def get_columns(cells):
@@ -77,39 +79,38 @@ def count_delimiters(cells):
     return count
 
 
-def column_homogeneity(column):
+def column_homogeneity(column, codes=None):
     """
     As the Proactive Wrangler (PW) paper doesn't give sufficient details on all 
     the types they implement, we use our own type inference engine (from 
     rudi_types) to guess the type. Note that "unicode_alphanum" is a generic 
     string type as is None. Empty cells are treated separately and are not 
-    considered a type in the PW paper.
+    considered a type in the PW paper. The cells are classified with 
+    eval_types_batch(), the type codes can be given if this is already done.
 
     """
-    type_counts = {}
-    for cell in column:
-        detected_type = eval_types(cell)
-        if detected_type is None:
-            detected_type = "string"
-        if detected_type == "unicode_alphanum":
-            detected_type = "string"
-        if detected_type == "empty":
-            continue
-        if not detected_type in type_counts:
-            type_counts[detected_type] = 0
-        type_counts[detected_type] += 1
+    if codes is None:
+        codes = eval_types_batch(column, eval_func=get_cell_type)
+    codes[codes == TYPE_CODES["unicode_alphanum"]] = TYPE_CODES[None]
+    types, first, counts = np.unique(
+        codes, return_index=True, return_counts=True
+    )
 
     R = len(column)
 
+    # the types are added in the order in which they first occur in the column
     homogeneity = 0
-    for t in type_counts:
-        homogeneity += pow(type_counts[t] / R, 2.0)
+    for k in np.argsort(first):
+        if types[k] == TYPE_CODES["empty"]:
+            continue
+        homogeneity += pow(int(counts[k]) / R, 2.0)
 
     return homogeneity
 
 
-def compute_suitability(data, dialect):
-    cells = extract_cells(data, dialect)
+def compute_suitability(data, dialect, cells=None):
+    if cells is None:
+        cells = extract_cells(data, dialect)
     columns = get_columns(cells)
 
     R = len(cells)
@@ -118,7 +119,17 @@ def compute_suitability(data, dialect):
     E = count_empties(cells, dialect)
     D = count_delimiters(cells)
 
-    homo = sum((column_homogeneity(columns[cidx]) for cidx in columns))
+    # the cells of all columns are classified in one batch
+    codes = eval_types_batch(
+        [c for cidx in columns for c in columns[cidx]],
+        eval_func=get_cell_type,
+    )
+    homo = 0
+    start = 0
+    for cidx in columns:
+        end = start + len(columns[cidx])
+        homo += column_homogeneity(columns[cidx], codes=codes[start:end])
+        start = end
     if R * C == 0:
         suitability = 0
     else:
@@ -155,8 +166,7 @@ def get_dialects(data, encoding):
 
 
 def determine_dqr(filename, verbose=False):
-    encoding = get_encoding(filename)
-    data = load_file(filename, encoding=encoding)
+    encoding, data = load_file_with_encoding(filename)
     if data is None:
         return DetectorResult(
             status=Status.SKIP, status_msg=StatusMsg.UNREADABLE
@@ -165,11 +175,17 @@ def determine_dqr(filename, verbose=False):
     dialects = get_dialects(data, encoding)
     scores = []
 
-    for dialect in sorted(dialects):
-        S = compute_suitability(data, dialect)
-        if verbose:
-            print("%15r\tsuitability = %.6f" % (dialect, S))
-        scores.append((S, dialect))
+    try:
+        for dialect, cells in iter_spans(data, sorted(dialects)):
+            S = compute_suitability(data, dialect, cells=cells)
+            if verbose:
+                print("%15r\tsuitability = %.6f" % (dialect, S))
+            scores.append((S, dialect))
+    finally:
+        clear_cell_types()
+
+    if verbose and not type_cache_stats() is None:
+        print(format_type_cache_stats())
 
     min_suit = min((x[0] for x in scores))
     min_dialects = [x[1] for x in scores if x[0] == min_suit]
@@ -15,8 +15,7 @@ import json
 import sys
 import regex
 
-from common.encoding import get_encoding
-from common.load import load_file
+from common.load import load_file_with_encoding
 from common.escape import is_potential_escapechar
 from common.utils import pairwise
 
@@ -754,8 +753,7 @@ def detect_form(filename, record_result=True, verbose=True):
         (is_form_19, {"delim": [","], "quotechar": ["", '"']}),
     ]
 
-    encoding = get_encoding(filename)
-    data = load_file(filename, encoding=encoding)
+    encoding, data = load_file_with_encoding(filename)
     if data is None:
         return "FAIL", {}
 
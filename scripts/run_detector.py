@@ -10,34 +10,30 @@ License: See the LICENSE file.
 
 """
 
+import importlib
 import sys
 
-from detection import (
-    our_score_full,
-    our_score_full_no_tie,
-    our_score_pattern_only,
-    our_score_type_only,
-    sniffer,
-    suitability,
-)
+# The detector modules are only imported when they're used, as some of them
+# are slow to import and every run uses only one of them.
+DETECTORS = {
+    "our_score_full": "detection.our_score_full",
+    "our_score_full_no_tie": "detection.our_score_full_no_tie",
+    "our_score_type_only": "detection.our_score_type_only",
+    "our_score_pattern_only": "detection.our_score_pattern_only",
+    "sniffer": "detection.sniffer",
+    "suitability": "detection.suitability",
+}
+
+
+def load_detector(detector):
+    if not detector in DETECTORS:
+        raise ValueError("Unknown detector: %s" % detector)
+    return importlib.import_module(DETECTORS[detector])
 
 
 def main():
     detector = sys.argv.pop(1)
-    if detector == "our_score_full":
-        our_score_full.main()
-    elif detector == "our_score_full_no_tie":
-        our_score_full_no_tie.main()
-    elif detector == "our_score_type_only":
-        our_score_type_only.main()
-    elif detector == "our_score_pattern_only":
-        our_score_pattern_only.main()
-    elif detector == "sniffer":
-        sniffer.main()
-    elif detector == "suitability":
-        suitability.main()
-    else:
-        raise ValueError("Unknown detector: %s" % detector)
+    load_detector(detector).main()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+Random corpora for the equivalence tests of the fast code paths
+
+The corpora are generated with a fixed seed, so every run of the tests uses
+the same cases.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import csv
+import io
+import random
+
+
+def fuzz_corpus(alphabet, n_cases=2000, max_len=12, seed=42):
+    """ Random strings of the characters in alphabet """
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+        for _ in range(n_cases)
+    ]
+
+
+def type_corpus(n_cases=5000, seed=42):
+    """ Random cells made of pieces of the different types """
+    pieces = [
+        "", " ", "0", "1", "7", "12", "31", "123", "2018", "1e5", "E", "e",
+        "-", "+", ".", ",", "/", ":", "T", "%", "$", "€", "n/a", "N/A",
+        "a", "Ab", "www.", "x@y.com", "http://", "年", "月",
+        "日", "\t", "!", "?", "(", "~", "2018-07-31", "31.07.2018",
+        "07/31/18", "12:30", "9:05", "23:59:59", "+01:00", "2018-07-31 12:30",
+        "2018-07-31T12:30:00",
+    ]
+    rng = random.Random(seed)
+    cells = []
+    for _ in range(n_cases):
+        k = rng.randint(1, 6)
+        cells.append("".join(rng.choice(pieces) for _ in range(k)))
+    return cells
+
+
+def number_corpus(n_cases=20000, seed=42):
+    """ Random strings of the characters that occur in numbers """
+    chars = "0123456789" * 3 + "+-.,eE" * 2 + "٣ x"
+    rng = random.Random(seed)
+    cells = []
+    for _ in range(n_cases):
+        k = rng.randint(0, 12)
+        cells.append("".join(rng.choice(chars) for _ in range(k)))
+    return cells
+
+
+def csv_corpus(n_files=40, n_rows=20, seed=42):
+    """ Random CSV files in different dialects, with some messy lines """
+    fields = [
+        "", "1", "-2.5", "1,234", "2018-07-31", "12:30", "5%", "$5", "n/a",
+        "abc", "Hello world", "a;b", "x|y", "tab\tin", 'say "hi"',
+        "http://example.com/x?y=1,2", "x@y.com", "line\nbreak",
+    ]
+    rng = random.Random(seed)
+    files = []
+    for _ in range(n_files):
+        buf = io.StringIO()
+        writer = csv.writer(
+            buf,
+            delimiter=rng.choice([",", ";", "\t", "|", " "]),
+            quotechar=rng.choice(['"', "'"]),
+            quoting=rng.choice([csv.QUOTE_MINIMAL, csv.QUOTE_ALL]),
+            lineterminator=rng.choice(["\n", "\r\n"]),
+        )
+        n_cols = rng.randint(1, 6)
+        for _ in range(rng.randint(1, n_rows)):
+            writer.writerow([rng.choice(fields) for _ in range(n_cols)])
+        text = buf.getvalue()
+        if rng.random() < 0.3:
+            text = "Some title: a, b; c\n" + text
+        files.append(text)
+    return files
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the single pass abstraction against the separate steps
+
+The reference implementation below builds the abstraction by applying the
+steps one after the other, each to the full string.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import io
+
+import pytest
+
+from common.dialect import Dialect
+from common.parser import CHUNK_SIZE
+from common.structural import StructuralIndex
+from detection.our_score_base import (
+    get_row_patterns,
+    make_abstraction,
+    stream_row_patterns,
+)
+
+from .corpora import fuzz_corpus
+
+DIALECTS = [
+    Dialect(d, q, e) for d in ",;" for q in ["", '"'] for e in ["", "|"]
+]
+
+
+def make_base_abstraction(S, dialect):
+    stack = ""
+    escape_next = False
+    for s in S:
+        if s in ["\r", "\n"]:
+            if not stack.endswith("R"):
+                stack += "R"
+        elif s == dialect.delimiter:
+            if escape_next:
+                stack += "C"
+                escape_next = False
+            else:
+                stack += "D"
+        elif s == dialect.quotechar:
+            if escape_next:
+                stack += "C"
+                escape_next = False
+            else:
+                stack += "Q"
+        elif s == dialect.escapechar:
+            if escape_next:
+                if not stack.endswith("C"):
+                    stack += "C"
+                escape_next = False
+            else:
+                escape_next = True
+        else:
+            if escape_next:
+                escape_next = False
+            if not stack.endswith("C"):
+                stack += "C"
+
+    return stack
+
+
+def merge_with_quotechar(S, dialect):
+    in_quotes = False
+    i = 0
+    quote_pairs = []
+    while i < len(S):
+        s = S[i]
+        if not s == "Q":
+            i += 1
+            continue
+
+        if not in_quotes:
+            in_quotes = True
+            begin_quotes = i
+        else:
+            if i + 1 < len(S) and S[i + 1] == "Q":
+                i += 1
+            else:
+                end_quotes = i
+                quote_pairs.append((begin_quotes, end_quotes))
+                in_quotes = False
+        i += 1
+
+    # replace quoted blocks by C
+    Sl = list(S)
+    for begin, end in quote_pairs:
+        for i in range(begin, end + 1):
+            Sl[i] = "C"
+    S = "".join(Sl)
+
+    return S
+
+
+def strip_trailing(abstract):
+    while abstract.endswith("R"):
+        abstract = abstract[:-1]
+    return abstract
+
+
+def fill_empties(abstract):
+    while "DD" in abstract:
+        abstract = abstract.replace("DD", "DCD")
+
+    while "DR" in abstract:
+        abstract = abstract.replace("DR", "DCR")
+
+    while "RD" in abstract:
+        abstract = abstract.replace("RD", "RCD")
+
+    while "CC" in abstract:
+        abstract = abstract.replace("CC", "C")
+
+    if abstract.startswith("D"):
+        abstract = "C" + abstract
+
+    if abstract.endswith("D"):
+        abstract += "C"
+
+    return abstract
+
+
+def make_abstraction_steps(data, dialect):
+    """ Make the abstraction by applying each step separately """
+    A = make_base_abstraction(data, dialect)
+    A = merge_with_quotechar(A, dialect)
+    A = fill_empties(A)
+    A = strip_trailing(A)
+
+    return A
+
+
+def test_make_abstraction():
+    for S in fuzz_corpus('ab,;"|\r\n', max_len=15):
+        for d in DIALECTS:
+            assert make_abstraction(S, d) == make_abstraction_steps(S, d)
+
+
+def test_make_abstraction_index():
+    for S in fuzz_corpus('ab,;"|\r\n', n_cases=200, max_len=15):
+        index = StructuralIndex.from_dialects(S, DIALECTS)
+        for d in DIALECTS:
+            expected = make_abstraction_steps(S, d)
+            assert make_abstraction(S, d, index=index) == expected
+
+
+def test_row_pattern_engines():
+    dialects = DIALECTS + [Dialect("|", '"', "|"), Dialect(",", "", ";")]
+    for S in fuzz_corpus('ab,;"|\r\n', max_len=15):
+        for d in dialects:
+            expected = list(get_row_patterns(S, d, engine="python").items())
+            for engine in ["numpy", "stream"]:
+                patterns = get_row_patterns(S, d, engine=engine)
+                assert list(patterns.items()) == expected
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 3, 7, CHUNK_SIZE])
+def test_row_patterns_chunks(chunksize):
+    # rows, quoted blocks, and escapes are split over the chunks
+    dialects = DIALECTS + [Dialect("|", '"', "|"), Dialect(",", "", ";")]
+    for S in fuzz_corpus('ab,;"|\r\n', n_cases=500, max_len=30):
+        for d in dialects:
+            expected = list(get_row_patterns(S, d).items())
+            stream = io.StringIO(S)
+            patterns = stream_row_patterns(stream, d, chunksize=chunksize)
+            assert list(patterns.items()) == expected, (S, d)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the selection of the potential dialects
+
+The reference implementation below tests for a single character whether it
+is always masked by quote characters, by walking over the full string. The
+prefilter of the dialects is tested by detecting the dialects of a random
+corpus with and without it.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import pytest
+
+from detection import our_score_full, our_score_pattern_only
+from detection.our_score_base import (
+    delimiter_upper_bounds,
+    filter_urls,
+    get_cells,
+    get_potential_dialects,
+    prefilter_dialects,
+    unmasked_chars,
+)
+
+from .corpora import csv_corpus, fuzz_corpus
+
+
+def masked_by_quotechar(S, quotechar, escapechar, test_char):
+    if test_char == "":
+        return False
+    escape_next = False
+    in_quotes = False
+    i = 0
+    while i < len(S):
+        s = S[i]
+        if s == quotechar:
+            if escape_next:
+                i += 1
+                continue
+            if not in_quotes:
+                in_quotes = True
+            else:
+                if i + 1 < len(S) and S[i + 1] == quotechar:
+                    i += 1
+                else:
+                    in_quotes = False
+        elif s == test_char and not in_quotes:
+            return False
+        elif s == escapechar:
+            escape_next = True
+        i += 1
+    return True
+
+
+def test_masked_by_quotechar():
+    assert masked_by_quotechar('A"B&C"A', '"', "", "&")
+    assert not masked_by_quotechar('A"B&C"A&A', '"', "", "&")
+    assert not masked_by_quotechar('A|"B&C"A', '"', "|", "&")
+    assert not masked_by_quotechar('A"B"C', '"', "", "")
+
+
+def test_unmasked_chars():
+    for S in fuzz_corpus('ab&"|'):
+        for quotechar in ["", '"']:
+            for escapechar in ["", "|"]:
+                chars = unmasked_chars(S, quotechar, escapechar)
+                for c in set(S):
+                    masked = masked_by_quotechar(S, quotechar, escapechar, c)
+                    assert (c in chars) != masked, (S, quotechar, escapechar)
+
+
+
+def no_prefilter(data, dialects, get_score, eps):
+    # the score functions expect the score of one dialect to be known
+    dialects = sorted(dialects)
+    get_score(dialects[0])
+    return dialects
+
+
+def write_corpus(tmp_path):
+    filenames = []
+    for i, text in enumerate(csv_corpus()):
+        filename = tmp_path / ("file_%i.csv" % i)
+        filename.write_bytes(text.encode("utf-8"))
+        filenames.append(str(filename))
+    return filenames
+
+
+@pytest.mark.parametrize("module", [our_score_full, our_score_pattern_only])
+def test_prefilter_same_dialect(tmp_path, monkeypatch, module):
+    filenames = write_corpus(tmp_path)
+    pruned = [module.wrap_determine_dqr(f) for f in filenames]
+    monkeypatch.setattr(module, "prefilter_dialects", no_prefilter)
+    exact = [module.wrap_determine_dqr(f) for f in filenames]
+    for f, a, b in zip(filenames, pruned, exact):
+        assert (a.dialect, a.status) == (b.dialect, b.status), f
+        assert b.n_pruned == 0
+    assert sum(res.n_pruned for res in pruned) > 0
+
+
+def test_prefilter_bounds():
+    n_pruned = 0
+    for data in csv_corpus():
+        dialects = get_potential_dialects(filter_urls(data), "utf-8")
+        delimiters = set(d.delimiter for d in dialects)
+        eps = our_score_full.EPS_PAT
+        bounds = delimiter_upper_bounds(data, delimiters, eps)
+
+        def get_score(dialect):
+            cells = get_cells(data, dialect)
+            pattern_score = our_score_full.get_pattern_score(data, dialect)
+            return pattern_score * our_score_full.get_type_score(cells)
+
+        kept = prefilter_dialects(data, dialects, get_score, eps)
+        n_pruned += len(dialects) - len(kept)
+        # the bound holds for every dialect, and so for the pruned ones
+        for d in dialects:
+            pattern_score = our_score_full.get_pattern_score(data, d)
+            assert pattern_score <= bounds[d.delimiter] * (1 + 1e-9), d
+    assert n_pruned > 0
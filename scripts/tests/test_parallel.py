@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the scoring of dialects with a pool of processes
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+from common.dialect import Dialect
+from detection._parallel import DialectPool
+from detection._types import (
+    disable_type_cache,
+    enable_type_cache,
+    type_cache_stats,
+)
+from detection.our_score_full import get_dialect_type_score, get_pattern_score
+
+DATA = "1;a,b,c\n2;d,e,f\n3;g,h,i\n"
+DIALECTS = [Dialect(",", "", ""), Dialect(";", "", "")]
+
+
+def test_type_cache_stats():
+    # the cells are only typed in the workers, whose lookups in the type
+    # cache are added to the counters of this process
+    enable_type_cache(100)
+    try:
+        with DialectPool(2) as pool:
+            pool.score(
+                DATA, DIALECTS, get_pattern_score, get_dialect_type_score
+            )
+        stats = type_cache_stats()
+    finally:
+        disable_type_cache()
+    assert stats["hits"] + stats["misses"] > 0
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the fast parsers against the generic parser
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import io
+
+from common.dialect import Dialect
+from common.parser import (
+    CHUNK_SIZE,
+    _parse_generic,
+    _parse_quoted,
+    _parse_unquoted,
+    first_difference,
+    iter_rows,
+    iter_spans,
+    parse_file,
+    parse_spans,
+    parse_spans_multi,
+)
+
+from .corpora import fuzz_corpus
+
+
+def test_parse_unquoted():
+    for S in fuzz_corpus('ab,;" \r\n'):
+        for d in [",", ";", "", None]:
+            for q in ["", None]:
+                assert _parse_unquoted(S, d) == _parse_generic(S, d, q, "")
+
+
+def test_parse_quoted():
+    for S in fuzz_corpus("ab,;\"' \r\n"):
+        for d in [",", ";", '"', "", None]:
+            for q in ['"', "'"]:
+                assert _parse_quoted(S, d, q) == _parse_generic(S, d, q, "")
+
+
+def test_parse_spans():
+    for S in fuzz_corpus('ab,"|\r\n', n_cases=1000):
+        for d in [",", "|", "", None]:
+            for q in ['"', "", None]:
+                for e in ["|", "", None]:
+                    kwargs = dict(delimiter=d, quotechar=q, escapechar=e)
+                    spans = parse_spans(S, **kwargs)
+                    assert spans.to_list() == parse_file(S, **kwargs)
+
+
+def test_parse_spans_multi():
+    dialects = [
+        Dialect(",", '"', ""),
+        Dialect(",", "", ""),
+        Dialect(";", "'", "|"),
+        Dialect("", "", ""),
+    ]
+    for S in fuzz_corpus("ab,;\"'|\r\n", n_cases=500):
+        parsed = parse_spans_multi(S, dialects)
+        for d in dialects:
+            assert parsed[d] == parse_spans(S, dialect=d)
+
+
+def test_iter_spans():
+    dialects = [
+        Dialect(d, q, e) for d in ",;" for q in ["", '"'] for e in ["", "|"]
+    ]
+    for S in fuzz_corpus('ab,;"|\r\n', n_cases=200):
+        parsed = parse_spans_multi(S, dialects)
+        for n in [1, 3, len(dialects)]:
+            result = list(iter_spans(S, dialects, group_size=n))
+            assert [d for d, _ in result] == dialects
+            assert all(spans == parsed[d] for d, spans in result)
+
+
+def test_iter_rows():
+    cases = [
+        ('A"B\r\nB"C\r\nD"E"F\r\nG', ("", '"', "")),
+        ('a,"', (",", '"', "")),
+        ('"a', (",", '"', "")),
+        ("a,b|,c", (",", '"', "|")),
+        ('a,"b,c|""', (",", '"', "|")),
+        ('a,"b,c"|', (",", '"', "|")),
+        ('a,"a""b""c"', (",", '"', "")),
+        ('a,"bc""d"",|"f|""', (",", '"', "|")),
+        ("\r\na,b\rc,d\n\re,f\r\n", (",", "", "")),
+        ("a,b,c||d,e|,d", (",", "", "|")),
+        ('a,b,"c,d\n', (",", '"', "")),
+        ('a,"ab"c,d', (",", '"', "")),
+        ('a,b""\n"c', (",", '"', "")),
+    ]
+    for S, (d, q, e) in cases:
+        expected = parse_file(S, delimiter=d, quotechar=q, escapechar=e)
+        for n in [1, 2, 3, 7, CHUNK_SIZE]:
+            rows = iter_rows(
+                io.StringIO(S), delimiter=d, quotechar=q, escapechar=e,
+                chunksize=n,
+            )
+            assert list(rows) == expected
+
+
+def first_difference_rows(S, dialect_a, dialect_b):
+    """ Reference implementation of first_difference() on the rows """
+    rows_a = iter_rows(io.StringIO(S), dialect=dialect_a)
+    rows_b = iter_rows(io.StringIO(S), dialect=dialect_b)
+    for row_a, row_b in zip(rows_a, rows_b):
+        for u, v in zip(row_a, row_b):
+            if u != v:
+                return (u, v)
+    return None
+
+
+def test_first_difference():
+    pairs = [
+        (Dialect(",", '"', ""), Dialect(",", '"', "|")),
+        (Dialect(",", "", ""), Dialect(",", "", "|")),
+        (Dialect(",", "", ""), Dialect(",", '"', "")),
+        (Dialect(";", '"', "|"), Dialect(";", '"', "|")),
+    ]
+    for S in fuzz_corpus('ab,;"|\r\n', n_cases=1000):
+        for A, B in pairs:
+            assert first_difference(S, A, B) == first_difference_rows(S, A, B)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the type scores that are estimated from a sample of the cells
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+from common.dialect import Dialect
+from detection import our_score_full
+from detection.our_score_base import get_cells
+
+from .corpora import csv_corpus
+
+SAMPLE_SIZE = 20
+
+
+def test_sampled_type_scores(tmp_path):
+    exact = set()
+    for i, text in enumerate(csv_corpus(n_files=20, n_rows=300, seed=1)):
+        filename = tmp_path / ("file_%i.csv" % i)
+        filename.write_bytes(text.encode("utf-8"))
+        expected = our_score_full.wrap_determine_dqr(str(filename))
+        res = our_score_full.wrap_determine_dqr(
+            str(filename), sample_size=SAMPLE_SIZE
+        )
+        assert (res.dialect, res.status) == (expected.dialect, expected.status)
+
+        for entry in res.sample_sizes or []:
+            dialect = Dialect.from_dict(entry["dialect"])
+            assert entry["sample_size"] == SAMPLE_SIZE
+            # only dialects with more cells than the sample size are sampled
+            assert entry["n_cells"] == len(get_cells(text, dialect))
+            assert entry["n_cells"] > SAMPLE_SIZE
+            exact.add(entry["exact"])
+
+    # some of the overlapping estimates are replaced by the exact scores
+    assert exact == {False, True}
+
+
+def test_no_sampling(tmp_path):
+    filename = tmp_path / "file.csv"
+    filename.write_bytes(csv_corpus(n_files=1, n_rows=300)[0].encode("utf-8"))
+    res = our_score_full.wrap_determine_dqr(str(filename))
+    assert res.sample_sizes is None
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the type detection against the separate type tests
+
+The reference implementation below runs the type tests one after the other,
+in order of precedence.
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+# The module is imported as a whole, so its test_* functions aren't collected
+from detection.lib.types import rudi_types
+
+from .corpora import number_corpus, type_corpus
+
+
+def eval_types_reference(cell, break_away=True):
+    type_tests = [
+        ("empty", rudi_types.test_empty),
+        ("url_or_email", rudi_types.test_url_or_email),
+        ("number", rudi_types.test_number),
+        ("time", rudi_types.test_time),
+        ("percentage", rudi_types.test_percentage),
+        ("currency", rudi_types.test_currency),
+        ("unicode_alphanum", rudi_types.test_unicode_alphanum),
+        ("nan", rudi_types.test_nan),
+        ("date", rudi_types.test_date),
+        ("datetime", rudi_types.test_datetime),
+    ]
+
+    detected = []
+    for name, func in type_tests:
+        if func(cell):
+            detected.append(name)
+            if break_away:
+                break
+
+    return rudi_types._check_detected(cell, detected)
+
+
+def test_eval_types():
+    cells = type_corpus()
+    for cell in cells:
+        assert rudi_types.eval_types(cell) == eval_types_reference(cell), cell
+    # the corpus covers all types
+    assert set(map(rudi_types.eval_types, cells)) == set(
+        rudi_types.TYPE_NAMES
+    )
+
+
+def test_eval_types_batch():
+    cells = type_corpus()
+    codes = rudi_types.eval_types_batch(cells)
+    assert [rudi_types.TYPE_NAMES[c] for c in codes] == list(
+        map(rudi_types.eval_types, cells)
+    )
+
+
+def test_scan_number():
+    numbers = ["number_1", "number_2", "number_3"]
+    for cell in number_corpus():
+        expected = any(
+            rudi_types.PATTERNS[name].fullmatch(cell) for name in numbers
+        )
+        assert rudi_types.scan_number(cell) == expected, cell
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the filtering of URLs from a stream of chunks
+
+Author: Gertjan van den Burg
+Copyright (c) 2018 - The Alan Turing Institute
+License: See the LICENSE file.
+
+"""
+
+import random
+
+from detection import our_score_base
+from detection.our_score_base import filter_urls, filter_urls_chunks
+
+PIECES = [
+    "a", "b,c", ";", "12", "http://", "example.com", "/x?y=1", "#z",
+    "x@y.com", "ftp:", "\t", '"',
+]
+
+
+def random_text(rng, n_words, sep):
+    words = []
+    for _ in range(n_words):
+        k = rng.randint(1, 3)
+        words.append("".join(rng.choice(PIECES) for _ in range(k)))
+    return sep.join(words)
+
+
+def split_chunks(rng, text, max_size):
+    chunks = []
+    i = 0
+    while i < len(text):
+        k = rng.randint(1, max_size)
+        chunks.append(text[i : i + k])
+        i += k
+    return chunks
+
+
+def test_filter_urls_chunks():
+    rng = random.Random(42)
+    for _ in range(500):
+        text = random_text(rng, 20, rng.choice([" ", "\n", " \n "]))
+        chunks = split_chunks(rng, text, 40)
+        assert "".join(filter_urls_chunks(chunks)) == filter_urls(text)
+
+
+def test_filter_urls_chunks_long_line(monkeypatch):
+    # the words are shorter than the limit, so the cuts are at spaces
+    monkeypatch.setattr(our_score_base, "MAX_URL_LENGTH", 50)
+    rng = random.Random(42)
+    for _ in range(200):
+        text = random_text(rng, 100, " ")
+        chunks = split_chunks(rng, text, 40)
+        output = list(filter_urls_chunks(chunks))
+        assert "".join(output) == filter_urls(text)
+        # the text isn't held back until the end
+        assert len(output) > 1